@@ -1,8 +1,24 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db import transaction
+from django.forms.models import BaseInlineFormSet
+from django.db.models import BooleanField, Case, Sum, Value, When
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import path, reverse
 from django.utils import timezone
-from django.utils.html import format_html
-from django.core.exceptions import ValidationError
-from .models import Categoria, Producto, Promocion, Cliente, Venta, DetalleVenta
+from django.utils.html import format_html, format_html_join
+from django.core.exceptions import PermissionDenied, ValidationError
+from .models import (
+    Categoria, Producto, Promocion, Cliente, Venta, DetalleVenta, Sucursal, StockSucursal,
+    VentaArchivada, DetalleVentaArchivado, PerfilSolicitud, SegmentoCliente, PronosticoProducto,
+    MovimientoStock,
+)
+from .inventario import movimientos_en_bloque, registrar_movimientos
+from .forms import ListaPreciosForm
+from .precios import leer_lista_precios, calcular_cambios, aplicar_cambios
+from .indice_promociones import obtener_indice
+from .routers import LecturaReplicaAdminMixin
+from .perfilado import directorio_perfiles, funciones_principales
 
 
 class ProductoInline(admin.TabularInline):
@@ -19,7 +35,7 @@ activar_promociones.short_description = "Activar promociones seleccionadas"
 
 
 @admin.register(Promocion)
-class PromocionAdmin(admin.ModelAdmin):
+class PromocionAdmin(LecturaReplicaAdminMixin, admin.ModelAdmin):
     list_display = ('nombre', 'tipo', 'valor_descuento', 'rango_fechas', 'es_vigente_status', 'num_productos')
     list_filter = ('activa', 'tipo', 'fecha_inicio', 'fecha_fin')
     search_fields = ('nombre', 'descripcion')
@@ -33,7 +49,7 @@ class PromocionAdmin(admin.ModelAdmin):
     rango_fechas.short_description = "Vigencia"
 
     def es_vigente_status(self, obj):
-        if obj.es_vigente:
+        if obj.vigente_hoy:
             return format_html('<span style="color: green; font-weight: bold;">ACTIVA</span>')
         elif obj.fecha_fin < timezone.now().date():
             return format_html('<span style="color: red;">FINALIZADA</span>')
@@ -54,7 +70,11 @@ class PromocionAdmin(admin.ModelAdmin):
 
 
     def get_queryset(self, request):
-        qs = super().get_queryset(request)
+        # Las vigentes de hoy salen del índice una sola vez por petición y no una vez por fila.
+        vigentes = obtener_indice().ids_vigentes(timezone.now().date())
+        qs = super().get_queryset(request).annotate(vigente_hoy=Case(
+            When(id__in=vigentes, then=Value(True)), default=Value(False), output_field=BooleanField(),
+        ))
         if request.user.is_superuser:
             return qs
         if request.user.groups.filter(name='Marketing').exists():
@@ -72,14 +92,104 @@ class PromocionAdmin(admin.ModelAdmin):
 
 
 
+def _con_valor_mostrado(campo, db_field, nombre):
+    """
+    El valor de stock que vio el usuario viaja oculto en el formulario: así changed_data distingue
+    un cambio suyo de uno hecho por una venta mientras editaba.
+    """
+    if db_field.name == nombre:
+        campo.show_hidden_initial = True
+    return campo
+
+
+class StockSucursalInline(admin.TabularInline):
+    model = StockSucursal
+    extra = 0
+    verbose_name = "Stock en sucursal"
+    verbose_name_plural = "Stock por sucursal"
+
+    def formfield_for_dbfield(self, db_field, request, **kwargs):
+        return _con_valor_mostrado(super().formfield_for_dbfield(db_field, request, **kwargs), db_field, 'cantidad')
+
+
 @admin.register(Producto)
 class ProductoAdmin(admin.ModelAdmin):
-    list_display = ('nombre', 'categoria', 'precio', 'stock', 'fecha_vencimiento_format', 'es_por_vencer')
+    list_display = ('nombre', 'categoria', 'precio', 'stock', 'stock_sucursales', 'fecha_vencimiento_format', 'es_por_vencer')
     list_filter = ('categoria', 'stock')
     search_fields = ('nombre', 'descripcion')
     date_hierarchy = 'fecha_vencimiento'
     ordering = ('categoria__nombre', 'nombre')
     list_editable = ('precio', 'stock')
+    inlines = [StockSucursalInline]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(total_sucursales=Sum('stocks_sucursal__cantidad'))
+
+    def formfield_for_dbfield(self, db_field, request, **kwargs):
+        return _con_valor_mostrado(super().formfield_for_dbfield(db_field, request, **kwargs), db_field, 'stock')
+
+    def save_model(self, request, obj, form, change):
+        """
+        El stock editado aquí o en la lista (list_editable) deja su diferencia en el libro de stock.
+        La diferencia se toma del stock actual, con la fila bloqueada, y no del que mostraba el
+        formulario: una venta confirmada mientras se editaba ya dejó su propio movimiento. Si el
+        stock no se tocó, se conserva el actual.
+        """
+        with transaction.atomic():
+            anterior = 0
+            if change:
+                anterior = Producto.objects.select_for_update().values_list('stock', flat=True).get(pk=obj.pk)
+                if 'stock' not in form.changed_data:
+                    obj.stock = anterior
+            super().save_model(request, obj, form, change)
+            registrar_movimientos([MovimientoStock(
+                producto=obj, cantidad=obj.stock - anterior, tipo='AJUSTE' if change else 'INICIAL', usuario=request.user,
+            )])
+
+    def save_formset(self, request, form, formset, change):
+        """
+        Las filas de stock por sucursal agregadas, editadas o borradas también pasan por el libro,
+        con la misma regla que save_model: diferencias contra la cantidad actual bloqueada.
+        """
+        if formset.model is not StockSucursal:
+            return super().save_formset(request, form, formset, change)
+
+        actuales = dict(
+            StockSucursal.objects.select_for_update()
+            .filter(producto_id=form.instance.pk)
+            .values_list('id', 'cantidad')
+        )
+        diferencias = {}
+        nuevas = set()
+        for fila in formset.forms:
+            if not fila.has_changed() and fila not in formset.deleted_forms:
+                continue
+            if fila.instance.pk:
+                actual = actuales.get(fila.instance.pk, 0)
+                if 'cantidad' not in fila.changed_data:
+                    fila.instance.cantidad = fila.cleaned_data['cantidad'] = actual
+                clave = (fila.initial['sucursal'], fila.instance.producto_id)
+                diferencias[clave] = diferencias.get(clave, 0) - actual
+            elif fila not in formset.deleted_forms:
+                nuevas.add((fila.cleaned_data['sucursal'].pk, form.instance.pk))
+            if fila not in formset.deleted_forms:
+                clave = (fila.cleaned_data['sucursal'].pk, form.instance.pk)
+                diferencias[clave] = diferencias.get(clave, 0) + fila.cleaned_data['cantidad']
+
+        super().save_formset(request, form, formset, change)
+        # Una fila nueva abre la historia de su sucursal con un saldo inicial.
+        registrar_movimientos([
+            MovimientoStock(
+                producto_id=producto_id, sucursal_id=sucursal_id, cantidad=cantidad,
+                tipo='INICIAL' if (sucursal_id, producto_id) in nuevas else 'AJUSTE', usuario=request.user,
+            )
+            for (sucursal_id, producto_id), cantidad in diferencias.items()
+        ])
+
+    def stock_sucursales(self, obj):
+        return obj.total_sucursales if obj.total_sucursales is not None else "-"
+    stock_sucursales.short_description = 'Stock Sucursales'
+    stock_sucursales.admin_order_field = 'total_sucursales'
 
     def fecha_vencimiento_format(self, obj):
         return obj.fecha_vencimiento.strftime('%d/%m/%Y') if obj.fecha_vencimiento else "-"
@@ -91,13 +201,78 @@ class ProductoAdmin(admin.ModelAdmin):
         return format_html('<span style="color: green;">OK</span>')
     es_por_vencer.short_description = 'Alerta Vencimiento'
 
+    def get_urls(self):
+        urls = [
+            path(
+                'actualizar-precios/',
+                self.admin_site.admin_view(self.actualizar_precios_view),
+                name='gestion_producto_actualizar_precios',
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def actualizar_precios_view(self, request):
+        """Sube un CSV de precios/stock, muestra la vista previa y aplica los cambios al confirmar."""
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+
+        form = ListaPreciosForm()
+        cambios, errores, lista = None, [], ''
+
+        if request.method == 'POST' and 'confirmar' in request.POST:
+            # Se recalcula la diferencia al confirmar, por si el catálogo cambió desde la vista previa.
+            filas, errores = leer_lista_precios(request.POST.get('lista', ''))
+            cambios, errores_cambios = calcular_cambios(filas)
+            actualizados = aplicar_cambios(cambios, usuario=request.user)
+            self.message_user(request, f"{actualizados} producto(s) actualizados.", messages.SUCCESS)
+            if errores or errores_cambios:
+                self.message_user(request, f"{len(errores) + len(errores_cambios)} fila(s) ignoradas por errores.", messages.WARNING)
+            return redirect('admin:gestion_producto_changelist')
+
+        if request.method == 'POST':
+            form = ListaPreciosForm(request.POST, request.FILES)
+            if form.is_valid():
+                try:
+                    lista = form.cleaned_data['archivo'].read().decode('utf-8-sig')
+                except UnicodeDecodeError:
+                    form.add_error('archivo', "El archivo debe estar codificado en UTF-8.")
+                else:
+                    filas, errores = leer_lista_precios(lista)
+                    cambios, errores_cambios = calcular_cambios(filas)
+                    errores.extend(errores_cambios)
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': "Actualizar precios y stock",
+            'form': form,
+            'cambios': cambios,
+            'errores': errores,
+            'lista': lista,
+        }
+        return render(request, 'admin/gestion/producto/actualizar_precios.html', context)
+
+@admin.register(Sucursal)
+class SucursalAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'direccion', 'activa', 'unidades_en_stock')
+    list_filter = ('activa',)
+    search_fields = ('nombre', 'direccion')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(unidades=Sum('stocks__cantidad'))
+
+    def unidades_en_stock(self, obj):
+        return obj.unidades or 0
+    unidades_en_stock.short_description = 'Unidades en Stock'
+    unidades_en_stock.admin_order_field = 'unidades'
+
 @admin.register(Categoria)
 class CategoriaAdmin(admin.ModelAdmin):
     list_display = ('nombre', 'descripcion')
     search_fields = ('nombre',)
 
 @admin.register(Cliente)
-class ClienteAdmin(admin.ModelAdmin):
+class ClienteAdmin(LecturaReplicaAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'rut', 'telefono', 'direccion', 'num_ventas')
     search_fields = ('user__username', 'user__first_name', 'user__last_name', 'rut')
     raw_id_fields = ('user',)
@@ -108,8 +283,46 @@ class ClienteAdmin(admin.ModelAdmin):
 
 
 
+class DetalleVentaFormSet(BaseInlineFormSet):
+
+    def clean(self):
+        """
+        Las líneas nuevas descuentan stock al guardarse: se valida aquí que alcance (en la sucursal
+        de la venta o en el stock general) para responder con un error del formulario y no con
+        StockInsuficiente. El UPDATE condicional de descontar_stock sigue siendo la garantía final.
+        """
+        super().clean()
+        pedidas = {}
+        for form in self.forms:
+            if form.instance.pk or not form.has_changed() or self._should_delete_form(form):
+                continue
+            producto = form.cleaned_data.get('producto')
+            if producto:
+                pedidas[producto] = pedidas.get(producto, 0) + (form.cleaned_data.get('cantidad') or 0)
+        if not pedidas:
+            return
+
+        if self.instance.sucursal_id:
+            disponible = dict(
+                StockSucursal.objects
+                .filter(sucursal_id=self.instance.sucursal_id, producto__in=pedidas)
+                .values_list('producto_id', 'cantidad')
+            )
+        else:
+            disponible = dict(Producto.objects.filter(pk__in=[p.pk for p in pedidas]).values_list('id', 'stock'))
+
+        errores = [
+            f"Stock insuficiente para {producto.nombre}: se piden {cantidad} y hay {disponible.get(producto.pk, 0)}."
+            for producto, cantidad in pedidas.items()
+            if cantidad > disponible.get(producto.pk, 0)
+        ]
+        if errores:
+            raise ValidationError(errores)
+
+
 class DetalleVentaInline(admin.TabularInline):
     model = DetalleVenta
+    formset = DetalleVentaFormSet
     extra = 1  
     readonly_fields = ('subtotal', 'precio_unitario')
     
@@ -118,9 +331,9 @@ class DetalleVentaInline(admin.TabularInline):
 
 
 @admin.register(Venta)
-class VentaAdmin(admin.ModelAdmin):
-    list_display = ('id', 'cliente_nombre', 'fecha_venta', 'total_formateado')
-    list_filter = ('fecha_venta',)
+class VentaAdmin(LecturaReplicaAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'cliente_nombre', 'sucursal', 'fecha_venta', 'total_formateado')
+    list_filter = ('fecha_venta', 'sucursal')
     search_fields = ('cliente__user__username', 'id')
     inlines = [DetalleVentaInline]
     readonly_fields = ('total', 'fecha_venta')
@@ -132,3 +345,170 @@ class VentaAdmin(admin.ModelAdmin):
     def total_formateado(self, obj):
         return f"${obj.total:,.2f}"
     total_formateado.short_description = 'Total Venta'
+
+    def save_related(self, request, form, formsets, change):
+        """
+        Tras guardar los detalles se recalcula el total, para que no se desvíe de sus líneas. Los
+        movimientos de stock de los detalles nuevos se registran juntos.
+        """
+        with movimientos_en_bloque():
+            super().save_related(request, form, formsets, change)
+        form.instance.calcular_total()
+
+
+
+class DetalleVentaArchivadoInline(admin.TabularInline):
+    model = DetalleVentaArchivado
+    extra = 0
+    can_delete = False
+    fields = ('producto_nombre', 'cantidad', 'precio_unitario', 'subtotal')
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(VentaArchivada)
+class VentaArchivadaAdmin(admin.ModelAdmin):
+    """Consulta de ventas archivadas: solo lectura, se crean con 'archivar_ventas'."""
+    list_display = ('id', 'cliente', 'sucursal', 'fecha_venta', 'total', 'archivada_en')
+    list_filter = ('sucursal',)
+    search_fields = ('cliente__user__username', 'id')
+    date_hierarchy = 'fecha_venta'
+    list_select_related = ('cliente__user', 'sucursal')
+    inlines = [DetalleVentaArchivadoInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+
+@admin.register(PerfilSolicitud)
+class PerfilSolicitudAdmin(admin.ModelAdmin):
+    """Perfiles guardados por PerfiladoMiddleware: funciones más costosas y descarga del .prof."""
+    list_display = ('creado_en', 'metodo', 'ruta', 'estado', 'duracion_formateada', 'origen', 'usuario')
+    list_filter = ('origen', 'metodo', 'estado')
+    search_fields = ('ruta',)
+    date_hierarchy = 'creado_en'
+    list_select_related = ('usuario',)
+    fields = ('creado_en', 'metodo', 'ruta', 'estado', 'duracion_ms', 'origen', 'usuario', 'descarga', 'funciones')
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def duracion_formateada(self, obj):
+        return f"{obj.duracion_ms:,.0f} ms"
+    duracion_formateada.short_description = 'Duración'
+    duracion_formateada.admin_order_field = 'duracion_ms'
+
+    def descarga(self, obj):
+        url = reverse('admin:gestion_perfilsolicitud_descargar', args=[obj.pk])
+        return format_html('<a href="{}">{}</a> (abrir con <code>python -m pstats</code> o snakeviz)', url, obj.archivo)
+    descarga.short_description = 'Archivo'
+
+    def funciones(self, obj):
+        try:
+            filas = funciones_principales(obj.archivo)
+        except OSError:
+            return "El archivo del perfil ya no existe."
+        cuerpo = format_html_join(
+            '', '<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>',
+            ((f['funcion'], f['llamadas'], f"{f['propio_ms']:.1f}", f"{f['acumulado_ms']:.1f}") for f in filas),
+        )
+        return format_html(
+            '<table><thead><tr><th>Función</th><th>Llamadas</th><th>Propio (ms)</th>'
+            '<th>Acumulado (ms)</th></tr></thead><tbody>{}</tbody></table>',
+            cuerpo,
+        )
+    funciones.short_description = 'Funciones más costosas (tiempo acumulado)'
+
+    def get_urls(self):
+        urls = [
+            path(
+                '<int:pk>/descargar/',
+                self.admin_site.admin_view(self.descargar_view),
+                name='gestion_perfilsolicitud_descargar',
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def descargar_view(self, request, pk):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        perfil = get_object_or_404(PerfilSolicitud, pk=pk)
+        ruta = directorio_perfiles() / perfil.archivo
+        if not ruta.exists():
+            raise Http404("El archivo del perfil ya no existe.")
+        return FileResponse(ruta.open('rb'), as_attachment=True, filename=perfil.archivo)
+
+    def delete_model(self, request, obj):
+        (directorio_perfiles() / obj.archivo).unlink(missing_ok=True)
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        for archivo in queryset.values_list('archivo', flat=True):
+            (directorio_perfiles() / archivo).unlink(missing_ok=True)
+        super().delete_queryset(request, queryset)
+
+
+
+@admin.register(SegmentoCliente)
+class SegmentoClienteAdmin(admin.ModelAdmin):
+    """Resultados de 'calcular_rfm'; se consultan aquí o en el reporte de clientes."""
+    list_display = ('cliente', 'segmento', 'rfm', 'recencia_dias', 'frecuencia', 'monto', 'calculado_en')
+    list_filter = ('segmento', 'puntaje_r', 'puntaje_f', 'puntaje_m')
+    search_fields = ('cliente__user__username', 'cliente__user__email')
+    list_select_related = ('cliente__user',)
+    ordering = ('-rfm',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PronosticoProducto)
+class PronosticoProductoAdmin(admin.ModelAdmin):
+    """Resultados de 'calcular_pronosticos'; los más urgentes también salen en el dashboard."""
+    list_display = (
+        'producto', 'demanda_diaria', 'stock_actual', 'dias_cobertura', 'cantidad_reponer',
+        'unidades_en_riesgo', 'riesgo_merma', 'calculado_en',
+    )
+    list_filter = ('riesgo_merma', 'producto__categoria')
+    search_fields = ('producto__nombre',)
+    list_select_related = ('producto',)
+    ordering = ('-cantidad_reponer',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(MovimientoStock)
+class MovimientoStockAdmin(LecturaReplicaAdminMixin, admin.ModelAdmin):
+    """Libro de stock: solo lectura; las correcciones se hacen con 'reconciliar_inventario'."""
+    list_display = ('creado_en', 'producto', 'sucursal', 'cantidad', 'tipo', 'venta', 'usuario')
+    list_filter = ('tipo', 'sucursal', 'creado_en')
+    search_fields = ('producto__nombre',)
+    list_select_related = ('producto', 'sucursal', 'usuario')
+    raw_id_fields = ('producto', 'venta')
+    date_hierarchy = 'creado_en'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
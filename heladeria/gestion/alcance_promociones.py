@@ -0,0 +1,57 @@
+from django.db import transaction
+
+from .eventos import publicar, PROMOCION_CAMBIADA
+from .models import Producto, Promocion
+from .versiones import incrementar_version_catalogo, incrementar_version_promociones
+
+
+def filtrar_productos(q='', categoria_id=None):
+    """Productos por nombre (contiene) y/o categoría; es el filtro del selector y de 'agregar todos'."""
+    productos = Producto.objects.all()
+    if q:
+        productos = productos.filter(nombre__icontains=q)
+    if categoria_id:
+        productos = productos.filter(categoria_id=categoria_id)
+    return productos
+
+
+def asignar_productos(promocion, productos):
+    """
+    Agrega a la promoción todos los productos del queryset con un único bulk_create sobre la
+    tabla intermedia, sin cargar los productos. bulk_create no emite m2m_changed, así que aquí
+    se invalidan las versiones y se publica el evento que en otros casos hacen las señales.
+    Devuelve la cantidad de productos agregados.
+    """
+    Intermedia = Promocion.productos.through
+    actuales = Intermedia.objects.filter(promocion_id=promocion.pk).values('producto_id')
+    nuevos = list(productos.exclude(id__in=actuales).values_list('id', flat=True))
+    if not nuevos:
+        return 0
+
+    Intermedia.objects.bulk_create(
+        [Intermedia(promocion_id=promocion.pk, producto_id=producto_id) for producto_id in nuevos],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    transaction.on_commit(incrementar_version_promociones)
+    transaction.on_commit(incrementar_version_catalogo)
+    publicar(PROMOCION_CAMBIADA, {'promocion_id': promocion.pk, 'accion': 'productos_add', 'producto_ids': sorted(nuevos)})
+    return len(nuevos)
+
+
+def quitar_productos(promocion, productos):
+    """
+    Quita de la promoción los productos del queryset con un único delete sobre la tabla
+    intermedia; como en asignar_productos, invalida las versiones y publica el evento.
+    Devuelve la cantidad de productos quitados.
+    """
+    filas = Promocion.productos.through.objects.filter(promocion_id=promocion.pk, producto_id__in=productos.values('id'))
+    quitados = list(filas.values_list('producto_id', flat=True))
+    if not quitados:
+        return 0
+
+    filas.delete()
+    transaction.on_commit(incrementar_version_promociones)
+    transaction.on_commit(incrementar_version_catalogo)
+    publicar(PROMOCION_CAMBIADA, {'promocion_id': promocion.pk, 'accion': 'productos_remove', 'producto_ids': sorted(quitados)})
+    return len(quitados)
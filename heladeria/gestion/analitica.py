@@ -0,0 +1,144 @@
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum, F, DecimalField, ExpressionWrapper
+from django.db.models.functions import TruncDate
+
+from .models import DetalleVenta, EfectividadPromocion
+from .indice_promociones import obtener_indice
+
+
+class _SerieAcumulada:
+    """
+    Serie diaria dispersa con sumas acumuladas, para consultar totales de cualquier
+    rango de días con dos búsquedas binarias en lugar de recorrer las ventas.
+    """
+
+    def __init__(self):
+        self.dias = []
+        self.unidades = [0]
+        self.ingresos = [Decimal('0')]
+        self.descuento = [Decimal('0')]
+
+    def agregar(self, dia, unidades, ingresos, descuento):
+        """Agrega un día; los días deben llegar en orden ascendente."""
+        self.dias.append(dia)
+        self.unidades.append(self.unidades[-1] + unidades)
+        self.ingresos.append(self.ingresos[-1] + ingresos)
+        self.descuento.append(self.descuento[-1] + descuento)
+
+    def suma(self, desde, hasta):
+        """Devuelve (unidades, ingresos, descuento) entre ambas fechas, inclusive."""
+        i = bisect_left(self.dias, desde)
+        j = bisect_right(self.dias, hasta)
+        return (
+            self.unidades[j] - self.unidades[i],
+            self.ingresos[j] - self.ingresos[i],
+            self.descuento[j] - self.descuento[i],
+        )
+
+
+def ventana_base(promocion):
+    """Devuelve (inicio, fin) de la ventana base: los días inmediatamente anteriores, de igual duración."""
+    duracion = (promocion.fecha_fin - promocion.fecha_inicio).days + 1
+    return promocion.fecha_inicio - timedelta(days=duracion), promocion.fecha_inicio - timedelta(days=1)
+
+
+def _series_de_ventas(desde, hasta):
+    """
+    Agrupa en una sola consulta las ventas por producto y día, y arma una serie acumulada
+    por producto más una serie para toda la tienda.
+    """
+    descuento_linea = ExpressionWrapper(
+        (F('producto__precio') - F('precio_unitario')) * F('cantidad'),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    filas = (
+        DetalleVenta.objects
+        .filter(venta__fecha_venta__date__range=(desde, hasta))
+        .annotate(dia=TruncDate('venta__fecha_venta'))
+        .values('producto_id', 'dia')
+        .annotate(unidades=Sum('cantidad'), ingresos=Sum('subtotal'), descuento=Sum(descuento_linea))
+        .order_by('producto_id', 'dia')
+    )
+
+    por_producto = {}
+    totales_por_dia = {}
+    for fila in filas:
+        unidades = fila['unidades'] or 0
+        ingresos = fila['ingresos'] or Decimal('0')
+        descuento = fila['descuento'] or Decimal('0')
+
+        por_producto.setdefault(fila['producto_id'], _SerieAcumulada()).agregar(fila['dia'], unidades, ingresos, descuento)
+
+        total = totales_por_dia.setdefault(fila['dia'], [0, Decimal('0'), Decimal('0')])
+        total[0] += unidades
+        total[1] += ingresos
+        total[2] += descuento
+
+    tienda = _SerieAcumulada()
+    for dia in sorted(totales_por_dia):
+        tienda.agregar(dia, *totales_por_dia[dia])
+
+    return por_producto, tienda
+
+
+def _sumar(series, ids_productos, tienda, desde, hasta):
+    """Suma una ventana para los productos indicados, o para toda la tienda si no hay productos."""
+    if not ids_productos:
+        return tienda.suma(desde, hasta)
+
+    unidades, ingresos, descuento = 0, Decimal('0'), Decimal('0')
+    for producto_id in ids_productos:
+        serie = series.get(producto_id)
+        if serie is None:
+            continue
+        u, i, d = serie.suma(desde, hasta)
+        unidades += u
+        ingresos += i
+        descuento += d
+    return unidades, ingresos, descuento
+
+
+def calcular_efectividad_promociones():
+    """
+    Calcula unidades, ingresos, costo de descuento y uplift de todas las promociones
+    en una sola pasada sobre las ventas, y reemplaza los resultados almacenados.
+    """
+    promociones = obtener_indice().todas()
+    if not promociones:
+        EfectividadPromocion.objects.all().delete()
+        return []
+
+    desde = min(ventana_base(p)[0] for p in promociones)
+    hasta = max(p.fecha_fin for p in promociones)
+    series, tienda = _series_de_ventas(desde, hasta)
+
+    resultados = []
+    for promo in promociones:
+        base_inicio, base_fin = ventana_base(promo)
+
+        unidades, ingresos, descuento = _sumar(series, promo.productos, tienda, promo.fecha_inicio, promo.fecha_fin)
+        unidades_base, ingresos_base, _ = _sumar(series, promo.productos, tienda, base_inicio, base_fin)
+
+        uplift = None
+        if ingresos_base:
+            uplift = float((ingresos - ingresos_base) / ingresos_base * 100)
+
+        resultados.append(EfectividadPromocion(
+            promocion_id=promo.id,
+            unidades_promocion=unidades,
+            ingresos_promocion=ingresos,
+            unidades_base=unidades_base,
+            ingresos_base=ingresos_base,
+            costo_descuento=descuento,
+            uplift=uplift,
+        ))
+
+    with transaction.atomic():
+        EfectividadPromocion.objects.all().delete()
+        EfectividadPromocion.objects.bulk_create(resultados)
+
+    return resultados
@@ -0,0 +1,156 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import (
+    Venta, DetalleVenta, VentaArchivada, DetalleVentaArchivado,
+    Producto, ResumenArchivoDiario, ResumenArchivoCliente, ResumenArchivoProducto,
+)
+
+
+def _acumular_resumenes(modelo, campo_clave, acumulados, campos):
+    """
+    Suma los valores acumulados a las filas de resumen existentes (una consulta para leerlas)
+    y crea las que falten, con un bulk_update y un bulk_create.
+    """
+    existentes = modelo.objects.in_bulk(list(acumulados))
+    nuevos, actualizados = [], []
+
+    for clave, valores in acumulados.items():
+        fila = existentes.get(clave)
+        if fila is None:
+            nuevos.append(modelo(**{campo_clave: clave}, **valores))
+            continue
+        for campo, valor in valores.items():
+            if campo == 'ultima_compra':
+                fila.ultima_compra = max(filter(None, [fila.ultima_compra, valor]))
+            else:
+                setattr(fila, campo, getattr(fila, campo) + valor)
+        actualizados.append(fila)
+
+    modelo.objects.bulk_create(nuevos, batch_size=500)
+    if actualizados:
+        modelo.objects.bulk_update(actualizados, campos, batch_size=500)
+
+
+@transaction.atomic
+def archivar_lote(fecha_limite, tamano_lote):
+    """
+    Mueve a las tablas de archivo hasta `tamano_lote` ventas anteriores a `fecha_limite`,
+    actualiza los resúmenes y borra los originales, todo en una transacción.
+    Devuelve la cantidad de ventas archivadas (0 cuando no quedan).
+    """
+    ids = list(
+        Venta.objects
+        .filter(fecha_venta__lt=fecha_limite)
+        .order_by('id')
+        .values_list('id', flat=True)[:tamano_lote]
+    )
+    if not ids:
+        return 0
+
+    ventas = list(Venta.objects.filter(id__in=ids).values('id', 'cliente_id', 'sucursal_id', 'fecha_venta', 'total'))
+    detalles = list(
+        DetalleVenta.objects
+        .filter(venta_id__in=ids)
+        .values('venta_id', 'producto_id', 'producto__nombre', 'cantidad', 'precio_unitario', 'subtotal')
+    )
+
+    VentaArchivada.objects.bulk_create([VentaArchivada(**venta) for venta in ventas], batch_size=500)
+    DetalleVentaArchivado.objects.bulk_create(
+        [
+            DetalleVentaArchivado(
+                venta_id=d['venta_id'], producto_id=d['producto_id'], producto_nombre=d['producto__nombre'],
+                cantidad=d['cantidad'], precio_unitario=d['precio_unitario'], subtotal=d['subtotal'],
+            )
+            for d in detalles
+        ],
+        batch_size=500,
+    )
+
+    por_dia, por_cliente, por_producto = {}, {}, {}
+    for venta in ventas:
+        dia = por_dia.setdefault(timezone.localdate(venta['fecha_venta']), {'ventas': 0, 'monto': Decimal('0')})
+        dia['ventas'] += 1
+        dia['monto'] += venta['total']
+
+        if venta['cliente_id'] is not None:
+            cliente = por_cliente.setdefault(
+                venta['cliente_id'], {'ordenes': 0, 'monto': Decimal('0'), 'ultima_compra': venta['fecha_venta']}
+            )
+            cliente['ordenes'] += 1
+            cliente['monto'] += venta['total']
+            cliente['ultima_compra'] = max(cliente['ultima_compra'], venta['fecha_venta'])
+
+    for d in detalles:
+        producto = por_producto.setdefault(d['producto_id'], {'unidades': 0, 'ingresos': Decimal('0')})
+        producto['unidades'] += d['cantidad']
+        producto['ingresos'] += d['subtotal']
+
+    _acumular_resumenes(ResumenArchivoDiario, 'fecha', por_dia, ['ventas', 'monto'])
+    _acumular_resumenes(ResumenArchivoCliente, 'cliente_id', por_cliente, ['ordenes', 'monto', 'ultima_compra'])
+    _acumular_resumenes(ResumenArchivoProducto, 'producto_id', por_producto, ['unidades', 'ingresos'])
+
+    DetalleVenta.objects.filter(venta_id__in=ids).delete()
+    Venta.objects.filter(id__in=ids).delete()
+
+    return len(ids)
+
+
+def totales_archivados():
+    """Cantidad y monto de todas las ventas archivadas, desde los resúmenes diarios."""
+    totales = ResumenArchivoDiario.objects.aggregate(ventas=Sum('ventas'), monto=Sum('monto'))
+    return totales['ventas'] or 0, totales['monto'] or 0
+
+
+def ranking_productos_vendidos(limite=5):
+    """
+    Ranking por unidades combinando las ventas vigentes con los resúmenes del archivo. La suma y
+    el orden se resuelven en la base (ORDER BY ... LIMIT), sin traer todo el catálogo.
+    """
+    vigentes = (
+        DetalleVenta.objects
+        .filter(producto_id=OuterRef('pk'))
+        .values('producto_id')
+        .annotate(total=Sum('cantidad'))
+        .values('total')
+    )
+    ranking = (
+        Producto.objects
+        .annotate(total_vendido=Coalesce(Subquery(vigentes), Value(0)) + Coalesce(F('resumen_archivo__unidades'), Value(0)))
+        .filter(total_vendido__gt=0)
+        .order_by('-total_vendido', 'nombre')
+        .values_list('nombre', 'total_vendido')[:limite]
+    )
+    return [{'producto__nombre': nombre, 'total_vendido': total} for nombre, total in ranking]
+
+
+def pedidos_de_cliente(cliente, pagina, por_pagina):
+    """
+    Página del historial de un cliente: primero sus ventas vigentes y, al agotarse,
+    las archivadas (ambas de la más nueva a la más antigua). Devuelve (pedidos, total).
+    """
+    vigentes = Venta.objects.filter(cliente=cliente)
+    cantidad_vigentes = vigentes.count()
+    resumen = ResumenArchivoCliente.objects.filter(cliente=cliente).values_list('ordenes', flat=True).first() or 0
+    total = cantidad_vigentes + resumen
+
+    desde = (pagina - 1) * por_pagina
+    hasta = desde + por_pagina
+
+    pedidos = []
+    if desde < cantidad_vigentes:
+        pedidos.extend(
+            vigentes.prefetch_related('detalles__producto').order_by('-fecha_venta')[desde:min(hasta, cantidad_vigentes)]
+        )
+    if hasta > cantidad_vigentes and resumen:
+        pedidos.extend(
+            VentaArchivada.objects
+            .filter(cliente=cliente)
+            .prefetch_related('detalles')
+            .order_by('-fecha_venta')[max(desde - cantidad_vigentes, 0):hasta - cantidad_vigentes]
+        )
+    return pedidos, total
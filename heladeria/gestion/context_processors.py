@@ -1,3 +1,8 @@
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from .routers import estado_replica
+from .versiones import version_catalogo
 
 
 def roles(request):
@@ -5,21 +10,51 @@ def roles(request):
     
     
     user = request.user
+    grupos = None
     
     
+    def nombres_grupos():
+        # Una sola consulta por request, compartida por todos los chequeos de rol.
+        nonlocal grupos
+        if grupos is None:
+            grupos = set(user.groups.values_list('name', flat=True)) if user.is_authenticated else set()
+        return grupos
+
     def es_admin():
         
         if not user.is_authenticated:
             return False
-        return user.is_superuser or user.groups.filter(name='Administradores').exists()
+        return user.is_superuser or 'Administradores' in nombres_grupos()
 
     def es_mktg_o_admin():
         if not user.is_authenticated:
             return False
-        return user.is_superuser or user.groups.filter(name__in=['Administradores', 'Marketing']).exists()
+        return user.is_superuser or bool({'Administradores', 'Marketing'} & nombres_grupos())
+
+    def roles_clave():
+        """Identifica el conjunto de roles, usado como clave del fragmento de navegación."""
+        if not user.is_authenticated:
+            return 'anonimo'
+        partes = ['superuser'] if user.is_superuser else []
+        partes.extend(sorted(nombres_grupos()))
+        return '|'.join(partes) or 'sin-rol'
 
     return {
         
         'es_admin_role': es_admin,
         'es_mktg_o_admin_role': es_mktg_o_admin,
-    }
\ No newline at end of file
+        'roles_clave': roles_clave,
+    }
+
+
+def catalogo(request):
+    """Expone la versión del catálogo y la duración de los fragmentos en caché."""
+    return {
+        'catalogo_version': SimpleLazyObject(version_catalogo),
+        'cache_fragmentos_segundos': settings.CACHE_FRAGMENTOS_SEGUNDOS,
+    }
+
+
+def replica(request):
+    """Estado de la réplica de reportes, evaluado solo si la plantilla lo usa."""
+    return {'estado_replica': SimpleLazyObject(estado_replica)}
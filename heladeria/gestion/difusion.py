@@ -0,0 +1,87 @@
+import asyncio
+import json
+import threading
+from datetime import date
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+def formatear_sse(evento, datos):
+    """Mensaje Server-Sent Events: nombre del evento y una línea de datos JSON."""
+    return f"event: {evento}\ndata: {json.dumps(datos, cls=DjangoJSONEncoder)}\n\n"
+
+
+def estado_promociones(fecha=None):
+    """Descuentos vigentes hoy: los globales (todo el catálogo) y los específicos por producto."""
+    from .indice_promociones import obtener_indice
+
+    globales, por_producto = [], {}
+    for promo in obtener_indice().vigentes(fecha or date.today()):
+        if promo.es_global:
+            globales.append(promo.valor_descuento)
+            continue
+        for producto_id in promo.productos:
+            por_producto.setdefault(producto_id, []).append(promo.valor_descuento)
+    return {'globales': globales, 'por_producto': por_producto}
+
+
+class Difusor:
+    """
+    Reparte los eventos del proceso a las conexiones SSE abiertas. Cada suscriptor es una cola
+    asyncio acotada de su propio event loop; se publica desde cualquier hilo con
+    call_soon_threadsafe. Un suscriptor que no da abasto recibe 'recargar' en lugar de los deltas perdidos.
+    """
+
+    TAMANO_COLA = 100
+
+    def __init__(self):
+        self._suscriptores = set()
+        self._candado = threading.Lock()
+
+    def hay_suscriptores(self):
+        return bool(self._suscriptores)
+
+    def suscribir(self):
+        """Se llama desde el event loop de la conexión."""
+        suscriptor = (asyncio.get_running_loop(), asyncio.Queue(maxsize=self.TAMANO_COLA))
+        with self._candado:
+            self._suscriptores.add(suscriptor)
+        return suscriptor
+
+    def desuscribir(self, suscriptor):
+        with self._candado:
+            self._suscriptores.discard(suscriptor)
+
+    def difundir(self, mensaje):
+        with self._candado:
+            suscriptores = list(self._suscriptores)
+        for suscriptor in suscriptores:
+            loop, cola = suscriptor
+            try:
+                loop.call_soon_threadsafe(self._entregar, cola, mensaje)
+            except RuntimeError:
+                # El event loop de la conexión ya se cerró.
+                self.desuscribir(suscriptor)
+
+    @staticmethod
+    def _entregar(cola, mensaje):
+        try:
+            cola.put_nowait(mensaje)
+        except asyncio.QueueFull:
+            while not cola.empty():
+                cola.get_nowait()
+            cola.put_nowait(formatear_sse('recargar', {}))
+
+    def difundir_evento(self, evento):
+        """Traduce un evento del registro (gestion.eventos) al delta que necesita la tienda."""
+        from .eventos import STOCK_CAMBIADO, PROMOCION_CAMBIADA
+
+        if not self.hay_suscriptores():
+            return
+        if evento['tipo'] == STOCK_CAMBIADO:
+            self.difundir(formatear_sse('stock', evento['datos']))
+        elif evento['tipo'] == PROMOCION_CAMBIADA:
+            self.difundir(formatear_sse('promociones', estado_promociones()))
+
+
+difusor = Difusor()
@@ -0,0 +1,184 @@
+import atexit
+import gzip
+import json
+import logging
+import queue
+import shutil
+import threading
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .difusion import difusor
+
+
+logger = logging.getLogger(__name__)
+
+ARCHIVO_ACTIVO = 'eventos.jsonl'
+
+VENTA_CREADA = 'venta_creada'
+STOCK_CAMBIADO = 'stock_cambiado'
+PROMOCION_CAMBIADA = 'promocion_cambiada'
+
+
+def directorio_eventos():
+    directorio = Path(settings.EVENTOS_DIR)
+    directorio.mkdir(parents=True, exist_ok=True)
+    return directorio
+
+
+def archivos_de_eventos():
+    """Archivos del registro en orden cronológico: los rotados (.gz) y al final el activo."""
+    directorio = directorio_eventos()
+    rotados = sorted(directorio.glob('eventos-*.jsonl.gz'))
+    activo = directorio / ARCHIVO_ACTIVO
+    return rotados + ([activo] if activo.exists() else [])
+
+
+class EscritorEventos:
+    """
+    Hilo que agrega los eventos al archivo activo. Las peticiones solo encolan (sin esperar):
+    si la cola está llena el evento se descarta y se registra en el log, nunca se bloquea.
+    Al superar EVENTOS_TAMANO_MAX bytes el archivo se rota y se comprime con gzip.
+    """
+
+    def __init__(self):
+        self.cola = queue.Queue(maxsize=settings.EVENTOS_COLA_MAX)
+        self.descartados = 0
+        self._hilo = None
+        self._candado = threading.Lock()
+
+    def encolar(self, evento):
+        self._iniciar()
+        try:
+            self.cola.put_nowait(evento)
+        except queue.Full:
+            self.descartados += 1
+            logger.error("Cola de eventos llena: se descartó %s %s", evento['tipo'], evento['id'])
+
+    def _iniciar(self):
+        if self._hilo is not None:
+            return
+        with self._candado:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._escribir, name='escritor-eventos', daemon=True)
+                self._hilo.start()
+                atexit.register(self.detener)
+
+    def detener(self, espera=5):
+        """Escribe lo pendiente y termina el hilo (se llama al salir del proceso)."""
+        if self._hilo is None:
+            return
+        try:
+            self.cola.put(None, timeout=espera)
+        except queue.Full:
+            return
+        self._hilo.join(espera)
+        self._hilo = None
+
+    def _escribir(self):
+        ruta = directorio_eventos() / ARCHIVO_ACTIVO
+        while True:
+            lote = [self.cola.get()]
+            # Se vacía lo que ya esté en cola para escribir y sincronizar una vez por lote.
+            while len(lote) < 500:
+                try:
+                    lote.append(self.cola.get_nowait())
+                except queue.Empty:
+                    break
+
+            eventos = [evento for evento in lote if evento is not None]
+            try:
+                if eventos:
+                    with open(ruta, 'a', encoding='utf-8') as archivo:
+                        for evento in eventos:
+                            archivo.write(json.dumps(evento, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+                    if ruta.stat().st_size >= settings.EVENTOS_TAMANO_MAX:
+                        self._rotar(ruta)
+            except OSError:
+                logger.exception("No se pudieron escribir %d evento(s)", len(eventos))
+
+            if len(eventos) < len(lote):
+                return
+
+    def _rotar(self, ruta):
+        # Primero se renombra (atómico) y luego se comprime: otro proceso que escriba después
+        # ya abre un archivo activo nuevo.
+        rotado = ruta.with_name(f"eventos-{timezone.now():%Y%m%d-%H%M%S-%f}.jsonl")
+        ruta.rename(rotado)
+        with open(rotado, 'rb') as origen, gzip.open(f"{rotado}.gz", 'wb') as comprimido:
+            shutil.copyfileobj(origen, comprimido)
+        rotado.unlink()
+
+
+escritor = EscritorEventos()
+
+
+def publicar(tipo, datos):
+    """
+    Registra un evento cuando la transacción actual se confirme; si se revierte, no queda rastro.
+    Fuera de una transacción se encola de inmediato. Además se difunde a las conexiones SSE del proceso.
+    """
+    def despachar():
+        evento = {'id': uuid.uuid4().hex, 'tipo': tipo, 'fecha': timezone.now(), 'datos': datos}
+        if settings.EVENTOS_HABILITADOS:
+            escritor.encolar(evento)
+        difusor.difundir_evento(evento)
+
+    transaction.on_commit(despachar)
+
+
+def publicar_venta(venta, detalles):
+    publicar(VENTA_CREADA, {
+        'venta_id': venta.id,
+        'cliente_id': venta.cliente_id,
+        'sucursal_id': venta.sucursal_id,
+        'fecha_venta': venta.fecha_venta,
+        'total': venta.total,
+        'detalles': [
+            {
+                'producto_id': detalle.producto_id,
+                'cantidad': detalle.cantidad,
+                'precio_unitario': detalle.precio_unitario,
+                'subtotal': detalle.subtotal,
+            }
+            for detalle in detalles
+        ],
+    })
+
+
+def publicar_stock(producto_id, sucursal_id=None, delta=None, stock=None):
+    """`delta` para descuentos relativos (ventas); `stock` cuando se fija el valor absoluto."""
+    datos = {'producto_id': producto_id, 'sucursal_id': sucursal_id}
+    if delta is not None:
+        datos['delta'] = delta
+    if stock is not None:
+        datos['stock'] = stock
+    publicar(STOCK_CAMBIADO, datos)
+
+
+def leer_archivo(ruta):
+    abrir = gzip.open if ruta.suffix == '.gz' else open
+    with abrir(ruta, 'rt', encoding='utf-8') as archivo:
+        for linea in archivo:
+            # Una línea sin salto final es un evento que se está escribiendo: se omite.
+            if linea.endswith('\n'):
+                yield json.loads(linea)
+
+
+def leer_eventos(desde=None, archivos=None):
+    """
+    Recorre los eventos registrados en orden. Con `desde` (id de evento) empieza
+    después de ese evento, para que un consumidor retome donde quedó.
+    """
+    pendiente = desde is not None
+    for ruta in archivos if archivos is not None else archivos_de_eventos():
+        for evento in leer_archivo(ruta):
+            if pendiente:
+                pendiente = evento['id'] != desde
+                continue
+            yield evento
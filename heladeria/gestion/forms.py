@@ -1,8 +1,12 @@
+from functools import reduce
+from operator import or_
+
 from django.contrib.auth.forms import UserCreationForm
 from django import forms
 from django.contrib.auth.models import User
 
-from .models import Cliente, Promocion, Producto 
+from .models import Categoria, Cliente, Promocion, Producto 
+from .alcance_promociones import asignar_productos, filtrar_productos, quitar_productos
 
 
 
@@ -53,18 +57,40 @@ class ClienteUserCreationForm(UserCreationForm):
 
 class PromocionForm(forms.ModelForm):
 
-    """Formulario para crear y editar promociones."""
+    """
+    Formulario para crear y editar promociones. El alcance no viaja completo: se envían solo los
+    ids a agregar y a quitar (campos ocultos que arma el selector de la plantilla), así que ni el
+    formulario ni su validación recorren el catálogo o los productos ya asignados. Además se
+    pueden agregar categorías completas o todos los resultados de una búsqueda.
+    """
     
-    productos = forms.ModelMultipleChoiceField(
-        queryset=Producto.objects.all().order_by('nombre'),
+    agregar_productos = forms.ModelMultipleChoiceField(
+        queryset=Producto.objects.all(),
+        widget=forms.MultipleHiddenInput,
+        required=False,
+        label="Productos a agregar (sin productos, la promoción aplica a TODA la tienda)"
+    )
+    quitar_productos = forms.ModelMultipleChoiceField(
+        queryset=Producto.objects.all(),
+        widget=forms.MultipleHiddenInput,
+        required=False,
+        label="Productos a quitar"
+    )
+    quitar_todos = forms.BooleanField(required=False, label="Quitar todos los productos asignados")
+    categorias = forms.ModelMultipleChoiceField(
+        queryset=Categoria.objects.all().order_by('nombre'),
         widget=forms.CheckboxSelectMultiple,
         required=False,
-        label="Productos (dejar vacío para aplicar a TODA la tienda)"
+        label="Agregar todos los productos de las categorías"
+    )
+    filtro_q = forms.CharField(required=False, widget=forms.HiddenInput)
+    filtro_categoria = forms.ModelChoiceField(
+        queryset=Categoria.objects.all(), required=False, widget=forms.HiddenInput
     )
 
     class Meta:
         model = Promocion
-        fields = ['nombre', 'descripcion', 'tipo', 'valor_descuento', 'fecha_inicio', 'fecha_fin', 'productos', 'activa']
+        fields = ['nombre', 'descripcion', 'tipo', 'valor_descuento', 'fecha_inicio', 'fecha_fin', 'activa']
         widgets = {
             'fecha_inicio': forms.DateInput(attrs={'type': 'date'}),
             'fecha_fin': forms.DateInput(attrs={'type': 'date'}),
@@ -88,8 +114,32 @@ class PromocionForm(forms.ModelForm):
             self.add_error('valor_descuento', "El porcentaje debe estar entre 1 y 100.")
 
         return cleaned_data
-        
-        
+
+    def _save_m2m(self):
+        """
+        Aplica los cambios de alcance en bloque: primero lo que se quita y después, en una sola
+        inserción, los productos elegidos, los de las categorías y los del filtro.
+        """
+        super()._save_m2m()
+        promocion = self.instance
+        if self.cleaned_data.get('quitar_todos'):
+            quitar_productos(promocion, Producto.objects.all())
+        elif self.cleaned_data.get('quitar_productos'):
+            quitar_productos(promocion, self.cleaned_data['quitar_productos'])
+
+        agregar = []
+        if self.cleaned_data.get('agregar_productos'):
+            agregar.append(self.cleaned_data['agregar_productos'])
+        if self.cleaned_data.get('categorias'):
+            agregar.append(Producto.objects.filter(categoria__in=self.cleaned_data['categorias']))
+        filtro_q = self.cleaned_data.get('filtro_q')
+        filtro_categoria = self.cleaned_data.get('filtro_categoria')
+        if filtro_q or filtro_categoria:
+            agregar.append(filtrar_productos(filtro_q, filtro_categoria.pk if filtro_categoria else None))
+        if agregar:
+            # El | de querysets une las condiciones con OR en una sola consulta.
+            asignar_productos(promocion, reduce(or_, agregar))
+
 
 class AgregarAlCarritoForm(forms.Form):
 
@@ -114,3 +164,13 @@ class AgregarAlCarritoForm(forms.Form):
         required=False,
         widget=forms.HiddenInput()
     )
+
+
+class ListaPreciosForm(forms.Form):
+
+    """Formulario para subir una lista de precios y/o stock en CSV."""
+
+    archivo = forms.FileField(
+        label="Archivo CSV",
+        help_text="Columnas: id (o nombre), precio y/o stock. Codificación UTF-8."
+    )
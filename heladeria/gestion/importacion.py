@@ -0,0 +1,24 @@
+"""
+Funciones auxiliares para importaciones masivas.
+
+Este módulo no importa modelos al cargarse: sus funciones se ejecutan también dentro
+de procesos hijos (hash de contraseñas), que deben poder inicializar Django por su cuenta.
+"""
+import os
+
+
+def inicializar_proceso():
+    """Inicializador de los procesos del pool: deja Django listo si el proceso parte desde cero."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'heladeria.settings')
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+
+def hashear_password(password):
+    """Devuelve el hash de la contraseña, o un hash inutilizable si viene vacía."""
+    from django.contrib.auth.hashers import make_password
+
+    return make_password(password or None)
@@ -0,0 +1,189 @@
+"""
+Índice en memoria de las promociones por rango de fechas y alcance de productos.
+
+Responde "qué promociones aplican el día D (al producto P)" y "qué promociones se
+superponen con el rango [A, B]" sin recorrer la tabla de promociones. Se construye una
+vez desde la base de datos y se reconstruye cuando cambia la versión de promociones.
+"""
+import threading
+from bisect import bisect_right
+from collections import namedtuple
+from operator import attrgetter
+
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import Promocion
+from .versiones import version_promociones
+
+
+class PromocionIndexada(namedtuple('PromocionIndexada', [
+    'id', 'nombre', 'tipo', 'valor_descuento', 'fecha_inicio', 'fecha_fin', 'activa', 'productos',
+])):
+    """Copia inmutable de una promoción; 'productos' es un frozenset de ids (vacío = toda la tienda)."""
+
+    __slots__ = ()
+
+    @property
+    def es_global(self):
+        return not self.productos
+
+    def aplica_a(self, producto_id, incluir_globales=True):
+        if not self.productos:
+            return incluir_globales
+        return producto_id in self.productos
+
+
+class _Nodo:
+    """Nodo de un árbol de intervalos centrado."""
+
+    __slots__ = ('centro', 'por_inicio', 'por_fin', 'izquierda', 'derecha')
+
+    def __init__(self, promociones):
+        puntos = sorted(p for promo in promociones for p in (promo.fecha_inicio, promo.fecha_fin))
+        self.centro = puntos[len(puntos) // 2]
+
+        izquierda, derecha, aqui = [], [], []
+        for promo in promociones:
+            if promo.fecha_fin < self.centro:
+                izquierda.append(promo)
+            elif promo.fecha_inicio > self.centro:
+                derecha.append(promo)
+            else:
+                aqui.append(promo)
+
+        self.por_inicio = sorted(aqui, key=attrgetter('fecha_inicio'))
+        self.por_fin = sorted(aqui, key=attrgetter('fecha_fin'), reverse=True)
+        self.izquierda = _Nodo(izquierda) if izquierda else None
+        self.derecha = _Nodo(derecha) if derecha else None
+
+    def que_contienen(self, fecha, resultado):
+        nodo = self
+        while nodo is not None:
+            if fecha < nodo.centro:
+                for promo in nodo.por_inicio:
+                    if promo.fecha_inicio > fecha:
+                        break
+                    resultado.append(promo)
+                nodo = nodo.izquierda
+            elif fecha > nodo.centro:
+                for promo in nodo.por_fin:
+                    if promo.fecha_fin < fecha:
+                        break
+                    resultado.append(promo)
+                nodo = nodo.derecha
+            else:
+                resultado.extend(nodo.por_inicio)
+                break
+        return resultado
+
+
+class IndicePromociones:
+    """Árbol de intervalos para consultas puntuales más arreglo de inicios ordenados para rangos."""
+
+    def __init__(self, promociones):
+        self.promociones = {promo.id: promo for promo in promociones}
+        self._raiz = _Nodo(promociones) if promociones else None
+        self._por_inicio = sorted(promociones, key=attrgetter('fecha_inicio'))
+        self._inicios = [promo.fecha_inicio for promo in self._por_inicio]
+        self._ids_vigentes = {}
+
+    @classmethod
+    def desde_bd(cls):
+        """
+        Construye el índice con dos consultas: promociones y tabla intermedia de productos.
+        Lee siempre de la base principal, aunque se construya dentro de una vista de reportes.
+        """
+        productos_por_promocion = {}
+        intermedia = Promocion.productos.through.objects.db_manager(DEFAULT_DB_ALIAS)
+        for promocion_id, producto_id in intermedia.values_list('promocion_id', 'producto_id'):
+            productos_por_promocion.setdefault(promocion_id, set()).add(producto_id)
+
+        promociones = [
+            PromocionIndexada(
+                id=fila['id'], nombre=fila['nombre'], tipo=fila['tipo'], valor_descuento=fila['valor_descuento'],
+                fecha_inicio=fila['fecha_inicio'], fecha_fin=fila['fecha_fin'], activa=fila['activa'],
+                productos=frozenset(productos_por_promocion.get(fila['id'], ())),
+            )
+            for fila in Promocion.objects.db_manager(DEFAULT_DB_ALIAS).values(
+                'id', 'nombre', 'tipo', 'valor_descuento', 'fecha_inicio', 'fecha_fin', 'activa',
+            )
+        ]
+        return cls(promociones)
+
+    @staticmethod
+    def _filtrar(promociones, producto_id, incluir_globales, solo_activas):
+        if solo_activas:
+            promociones = [p for p in promociones if p.activa]
+        if producto_id is not None:
+            promociones = [p for p in promociones if p.aplica_a(producto_id, incluir_globales)]
+        elif not incluir_globales:
+            promociones = [p for p in promociones if not p.es_global]
+        return sorted(promociones, key=attrgetter('id'))
+
+    def todas(self):
+        """Devuelve todas las promociones indexadas, ordenadas por id."""
+        return sorted(self.promociones.values(), key=attrgetter('id'))
+
+    def obtener(self, promocion_id):
+        return self.promociones.get(promocion_id)
+
+    def vigentes(self, fecha, producto_id=None, incluir_globales=True, solo_activas=False):
+        """Promociones cuyo rango de fechas contiene 'fecha', opcionalmente las que aplican a un producto."""
+        encontradas = self._raiz.que_contienen(fecha, []) if self._raiz else []
+        return self._filtrar(encontradas, producto_id, incluir_globales, solo_activas)
+
+    def en_rango(self, desde, hasta, producto_id=None, incluir_globales=True, solo_activas=False):
+        """Promociones que se superponen con [desde, hasta]: las vigentes en 'desde' más las que empiezan dentro del rango."""
+        encontradas = self._raiz.que_contienen(desde, []) if self._raiz else []
+        encontradas.extend(self._por_inicio[bisect_right(self._inicios, desde):bisect_right(self._inicios, hasta)])
+        return self._filtrar(encontradas, producto_id, incluir_globales, solo_activas)
+
+    def ids_vigentes(self, fecha, solo_activas=True):
+        """Conjunto de ids vigentes en 'fecha', memorizado mientras el índice siga vigente."""
+        clave = (fecha, solo_activas)
+        if clave not in self._ids_vigentes:
+            self._ids_vigentes[clave] = frozenset(p.id for p in self.vigentes(fecha, solo_activas=solo_activas))
+        return self._ids_vigentes[clave]
+
+    def vigentes_por_producto(self, fecha, producto_ids, incluir_globales=True, solo_activas=False):
+        """Agrupa las promociones vigentes en 'fecha' por producto; solo incluye productos con alguna promoción."""
+        vigentes = self.vigentes(fecha, solo_activas=solo_activas)
+        globales = [p for p in vigentes if p.es_global] if incluir_globales else []
+        especificas = [p for p in vigentes if not p.es_global]
+
+        resultado = {}
+        for producto_id in producto_ids:
+            aplicables = globales + [p for p in especificas if producto_id in p.productos]
+            if aplicables:
+                resultado[producto_id] = sorted(aplicables, key=attrgetter('id'))
+        return resultado
+
+
+_indice = None
+_version_indice = None
+_candado = threading.Lock()
+
+
+def obtener_indice():
+    """Devuelve el índice del proceso, reconstruyéndolo si las promociones cambiaron desde que se armó."""
+    global _indice, _version_indice
+
+    version = version_promociones()
+    if _indice is not None and _version_indice == version:
+        return _indice
+
+    with _candado:
+        if _indice is None or _version_indice != version:
+            _indice = IndicePromociones.desde_bd()
+            _version_indice = version
+    return _indice
+
+
+def promociones_vigentes(fecha, producto_id=None, **opciones):
+    """Atajo: promociones vigentes en 'fecha' según el índice actual."""
+    return obtener_indice().vigentes(fecha, producto_id=producto_id, **opciones)
+
+
+def promociones_en_rango(desde, hasta, producto_id=None, **opciones):
+    """Atajo: promociones que se superponen con [desde, hasta] según el índice actual."""
+    return obtener_indice().en_rango(desde, hasta, producto_id=producto_id, **opciones)
@@ -0,0 +1,122 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .eventos import publicar_stock
+from .models import MovimientoStock, Producto, Sucursal, StockSucursal
+
+
+class StockInsuficiente(Exception):
+    """No hay stock suficiente para descontar la cantidad pedida."""
+
+
+_movimientos_pendientes = ContextVar('movimientos_pendientes', default=None)
+
+
+def registrar_movimientos(movimientos):
+    """
+    Agrega al libro de stock una lista de MovimientoStock con un solo bulk_create. Omite los de
+    cantidad 0 salvo los saldos iniciales, que marcan dónde empieza la historia de un stock.
+    """
+    return MovimientoStock.objects.bulk_create(
+        [m for m in movimientos if m.cantidad or m.tipo == 'INICIAL'], batch_size=1000,
+    )
+
+
+@contextmanager
+def movimientos_en_bloque():
+    """
+    Dentro del bloque, los movimientos de descontar_stock se acumulan y se registran al salir con
+    un solo bulk_create (una inserción por venta y no una por línea). Si el bloque falla no se
+    registra nada; debe usarse dentro de la transacción de la venta.
+    """
+    pendientes = []
+    token = _movimientos_pendientes.set(pendientes)
+    try:
+        yield
+    finally:
+        _movimientos_pendientes.reset(token)
+    registrar_movimientos(pendientes)
+
+
+def descontar_stock(producto, cantidad, sucursal_id=None, venta=None):
+    """
+    Descuenta stock con un UPDATE condicional: la verificación y el descuento ocurren en la
+    misma sentencia, por lo que dos compras simultáneas no pueden dejar el stock negativo.
+    Sin sucursal se descuenta del stock general del producto. El movimiento queda en el libro
+    de stock (al salir de movimientos_en_bloque, si se está dentro); debe llamarse dentro de la
+    transacción de la venta para que ambos se confirmen juntos.
+    """
+    if sucursal_id:
+        actualizados = (
+            StockSucursal.objects
+            .filter(sucursal_id=sucursal_id, producto_id=producto.pk, cantidad__gte=cantidad)
+            .update(cantidad=F('cantidad') - cantidad)
+        )
+    else:
+        actualizados = (
+            Producto.objects
+            .filter(pk=producto.pk, stock__gte=cantidad)
+            .update(stock=F('stock') - cantidad)
+        )
+
+    if not actualizados:
+        raise StockInsuficiente(f"Stock insuficiente para {producto.nombre}")
+
+    movimiento = MovimientoStock(
+        producto_id=producto.pk, sucursal_id=sucursal_id or None, cantidad=-cantidad, tipo='VENTA', venta=venta,
+    )
+    pendientes = _movimientos_pendientes.get()
+    if pendientes is not None:
+        pendientes.append(movimiento)
+    else:
+        movimiento.save()
+    publicar_stock(producto.pk, sucursal_id=sucursal_id or None, delta=-cantidad)
+
+
+def sucursales_activas():
+    return list(Sucursal.objects.filter(activa=True))
+
+
+def sucursal_de_sesion(request, sucursales=None):
+    """
+    Devuelve la sucursal elegida por el cliente (guardada en sesión), o la primera activa.
+    Devuelve None si no hay sucursales configuradas: se usa el stock general.
+    """
+    if sucursales is None:
+        sucursales = sucursales_activas()
+    if not sucursales:
+        return None
+
+    sucursal_id = request.session.get('sucursal_id')
+    for sucursal in sucursales:
+        if sucursal.id == sucursal_id:
+            return sucursal
+    return sucursales[0]
+
+
+def disponibilidad_por_sucursal(producto_ids):
+    """
+    Stock por producto y sucursal activa, en una sola consulta agregada.
+    Devuelve {producto_id: {sucursal_id: cantidad}}.
+    """
+    filas = (
+        StockSucursal.objects
+        .filter(producto_id__in=producto_ids, sucursal__activa=True)
+        .values('producto_id', 'sucursal_id')
+        .annotate(total=Sum('cantidad'))
+    )
+
+    disponibilidad = {}
+    for fila in filas:
+        disponibilidad.setdefault(fila['producto_id'], {})[fila['sucursal_id']] = fila['total']
+    return disponibilidad
+
+
+def con_stock_total(queryset):
+    """Anota 'stock_total': stock general más el de todas las sucursales."""
+    return queryset.annotate(
+        stock_total=F('stock') + Coalesce(Sum('stocks_sucursal__cantidad'), Value(0))
+    )
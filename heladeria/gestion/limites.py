@@ -0,0 +1,132 @@
+import math
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+
+
+class AlmacenCubetas:
+    """
+    Cubetas de tokens en memoria del proceso, compartidas por todos sus hilos. Cada cubeta es
+    [tokens, última actualización]; la recarga y el consumo se hacen bajo un mismo candado, así
+    que dos peticiones simultáneas nunca gastan el mismo token. Lleva además contadores por
+    nombre de URL para el monitoreo.
+    """
+
+    MAX_CUBETAS = 100000
+
+    def __init__(self):
+        self._cubetas = {}
+        self._contadores = defaultdict(lambda: {'permitidas': 0, 'rechazadas_ip': 0, 'rechazadas_usuario': 0})
+        self._candado = threading.Lock()
+
+    def consumir(self, clave, capacidad, por_segundo):
+        """Gasta un token de la cubeta. Devuelve 0 si se permitió, o los segundos a esperar."""
+        ahora = time.monotonic()
+        with self._candado:
+            tokens, actualizado = self._cubetas.get(clave, (capacidad, ahora))
+            tokens = min(capacidad, tokens + (ahora - actualizado) * por_segundo)
+            if tokens >= 1:
+                self._cubetas[clave] = (tokens - 1, ahora)
+                if len(self._cubetas) > self.MAX_CUBETAS:
+                    self._purgar(ahora)
+                return 0
+            self._cubetas[clave] = (tokens, ahora)
+            return (1 - tokens) / por_segundo
+
+    def _purgar(self, ahora):
+        # Una cubeta sin uso en el último minuto está llena (o casi) y equivale a no tenerla.
+        self._cubetas = {
+            clave: (tokens, actualizado)
+            for clave, (tokens, actualizado) in self._cubetas.items()
+            if ahora - actualizado < 60
+        }
+
+    def contar(self, nombre, resultado):
+        with self._candado:
+            self._contadores[nombre][resultado] += 1
+
+    def estado(self):
+        with self._candado:
+            return {
+                'cubetas_activas': len(self._cubetas),
+                'contadores': {nombre: dict(contador) for nombre, contador in self._contadores.items()},
+            }
+
+    def reiniciar(self):
+        with self._candado:
+            self._cubetas.clear()
+            self._contadores.clear()
+
+
+cubetas = AlmacenCubetas()
+
+
+def ip_cliente(request):
+    """IP del cliente; detrás de un proxy de confianza se toma la primera de X-Forwarded-For."""
+    if getattr(settings, 'LIMITES_TASA_CONFIAR_PROXY', False):
+        reenviada = request.META.get('HTTP_X_FORWARDED_FOR')
+        if reenviada:
+            return reenviada.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def respuesta_limite(espera):
+    response = HttpResponse(
+        "Demasiadas solicitudes. Espera unos segundos e inténtalo de nuevo.",
+        status=429, content_type='text/plain; charset=utf-8',
+    )
+    response['Retry-After'] = str(max(math.ceil(espera), 1))
+    return response
+
+
+class LimiteTasaMiddleware:
+    """
+    Limita por cubetas de tokens las vistas nombradas en LIMITES_TASA (nombre de URL de
+    gestion.urls -> {'ip': (ráfaga, por minuto), 'usuario': (ráfaga, por minuto)}) y responde
+    429 con Retry-After. La cubeta por IP se revisa primero porque no necesita la sesión: el
+    tráfico rechazado no llega a la base de datos.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.limites = getattr(settings, 'LIMITES_TASA', {})
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        nombre = request.resolver_match.url_name
+        limite = self.limites.get(nombre)
+        if not limite:
+            return None
+
+        if 'ip' in limite:
+            capacidad, por_minuto = limite['ip']
+            espera = cubetas.consumir(f"{nombre}:ip:{ip_cliente(request)}", capacidad, por_minuto / 60)
+            if espera:
+                cubetas.contar(nombre, 'rechazadas_ip')
+                return respuesta_limite(espera)
+
+        if 'usuario' in limite and request.user.is_authenticated:
+            capacidad, por_minuto = limite['usuario']
+            espera = cubetas.consumir(f"{nombre}:usuario:{request.user.pk}", capacidad, por_minuto / 60)
+            if espera:
+                cubetas.contar(nombre, 'rechazadas_usuario')
+                return respuesta_limite(espera)
+
+        cubetas.contar(nombre, 'permitidas')
+        return None
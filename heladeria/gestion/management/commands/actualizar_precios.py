@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion.precios import leer_lista_precios, calcular_cambios, aplicar_cambios
+
+
+class Command(BaseCommand):
+    help = "Actualiza precio y/o stock de productos desde un CSV (columnas: id o nombre, precio, stock)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del archivo CSV (UTF-8, con encabezados).")
+        parser.add_argument('--dry-run', action='store_true', help="Solo muestra la vista previa de los cambios.")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['archivo'], encoding='utf-8-sig') as archivo:
+                texto = archivo.read()
+        except OSError as e:
+            raise CommandError(f"No se pudo abrir el archivo: {e}")
+
+        filas, errores = leer_lista_precios(texto)
+        cambios, errores_cambios = calcular_cambios(filas)
+        errores.extend(errores_cambios)
+
+        for error in errores:
+            self.stdout.write(self.style.WARNING(error))
+
+        for cambio in cambios:
+            detalle = ", ".join(f"{campo}: {antes} -> {nuevo}" for campo, (antes, nuevo) in cambio['campos'].items())
+            self.stdout.write(f"#{cambio['producto'].id} {cambio['producto'].nombre}: {detalle}")
+
+        self.stdout.write(f"{len(filas)} filas leídas, {len(cambios)} productos con cambios, {len(errores)} errores.")
+
+        if options['dry_run']:
+            self.stdout.write("Vista previa: no se aplicó ningún cambio.")
+            return
+
+        actualizados = aplicar_cambios(cambios)
+        self.stdout.write(self.style.SUCCESS(f"{actualizados} producto(s) actualizados."))
@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from gestion.archivo import archivar_lote
+from gestion.models import Venta
+
+
+class Command(BaseCommand):
+    help = (
+        "Mueve las ventas anteriores al horizonte indicado a las tablas de archivo, por lotes "
+        "(una transacción por lote), y actualiza los resúmenes usados por los reportes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=730, help="Antigüedad mínima de las ventas a archivar (días).")
+        parser.add_argument('--lote', type=int, default=1000, help="Ventas por transacción.")
+        parser.add_argument('--dry-run', action='store_true', help="Solo informa cuántas ventas se archivarían.")
+
+    def handle(self, *args, **options):
+        fecha_limite = timezone.now() - timedelta(days=options['dias'])
+
+        if options['dry_run']:
+            pendientes = Venta.objects.filter(fecha_venta__lt=fecha_limite).count()
+            self.stdout.write(f"{pendientes} venta(s) anteriores a {fecha_limite:%Y-%m-%d} se archivarían.")
+            return
+
+        total = 0
+        while True:
+            archivadas = archivar_lote(fecha_limite, options['lote'])
+            if not archivadas:
+                break
+            total += archivadas
+            self.stdout.write(f"  {total} venta(s) archivadas...")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} venta(s) anteriores a {fecha_limite:%Y-%m-%d} movidas al archivo."
+        ))
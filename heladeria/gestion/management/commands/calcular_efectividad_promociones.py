@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from gestion.analitica import calcular_efectividad_promociones
+from gestion.models import EfectividadPromocion
+
+
+class Command(BaseCommand):
+    help = "Calcula la efectividad (uplift y costo de descuento) de todas las promociones y guarda los resultados."
+
+    def handle(self, *args, **options):
+        resultados = calcular_efectividad_promociones()
+
+        efectividades = (
+            EfectividadPromocion.objects
+            .select_related('promocion')
+            .order_by(F('uplift').desc(nulls_last=True))
+        )
+        for resultado in efectividades:
+            uplift = f"{resultado.uplift:+.1f}%" if resultado.uplift is not None else "sin base"
+            self.stdout.write(
+                f"{resultado.promocion.nombre}: {resultado.unidades_promocion} uds "
+                f"(base {resultado.unidades_base}), uplift {uplift}, "
+                f"costo descuento ${resultado.costo_descuento:,.0f}"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Efectividad calculada para {len(resultados)} promoción(es)."))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion.models import PronosticoProducto
+from gestion.pronosticos import ALFA, DIAS_HISTORIA, calcular_pronosticos
+
+
+class Command(BaseCommand):
+    help = (
+        "Pronostica la demanda diaria de cada producto (suavizado exponencial de las ventas diarias) "
+        "y calcula la cantidad a reponer y las unidades en riesgo de vencer sin venderse."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=DIAS_HISTORIA, help="Días de historia de ventas a usar.")
+        parser.add_argument('--alfa', type=float, default=ALFA, help="Factor de suavizado (0 < alfa <= 1).")
+
+    def handle(self, *args, **options):
+        if options['dias'] < 1 or not 0 < options['alfa'] <= 1:
+            raise CommandError("--dias debe ser positivo y --alfa estar entre 0 (excluido) y 1.")
+
+        inicio = time.perf_counter()
+        guardados = calcular_pronosticos(dias=options['dias'], alfa=options['alfa'])
+        duracion = time.perf_counter() - inicio
+
+        por_reponer = PronosticoProducto.objects.filter(cantidad_reponer__gt=0).count()
+        en_riesgo = PronosticoProducto.objects.filter(riesgo_merma=True).count()
+        self.stdout.write(f"  Productos a reponer: {por_reponer}")
+        self.stdout.write(f"  Productos con riesgo de merma: {en_riesgo}")
+        self.stdout.write(self.style.SUCCESS(f"{guardados} pronóstico(s) calculados en {duracion:.1f} s."))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from gestion.models import SegmentoCliente
+from gestion.segmentacion import calcular_rfm
+
+
+class Command(BaseCommand):
+    help = (
+        "Calcula los puntajes RFM (recencia, frecuencia, monto) y el segmento de cada cliente con compras. "
+        "Con --incremental solo recalcula los clientes con ventas nuevas desde el último cálculo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true', help="Recalcula solo clientes con ventas nuevas.")
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        guardados = calcular_rfm(incremental=options['incremental'])
+        duracion = time.perf_counter() - inicio
+
+        etiquetas = dict(SegmentoCliente.SEGMENTO_CHOICES)
+        conteos = SegmentoCliente.objects.values('segmento').annotate(total=Count('cliente')).order_by('-total')
+        for fila in conteos:
+            self.stdout.write(f"  {etiquetas[fila['segmento']]}: {fila['total']}")
+
+        self.stdout.write(self.style.SUCCESS(f"{guardados} cliente(s) segmentados en {duracion:.1f} s."))
@@ -0,0 +1,167 @@
+import threading
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from gestion.inventario import registrar_movimientos, sucursales_activas
+from gestion.models import Categoria, Cliente, DetalleVenta, MovimientoStock, Producto, StockSucursal, Venta
+
+
+def percentil(ordenados, p):
+    """Percentil por el método del rango más cercano sobre una lista ya ordenada."""
+    if not ordenados:
+        return 0
+    indice = max(int(round(p / 100 * len(ordenados))) - 1, 0)
+    return ordenados[min(indice, len(ordenados) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Prueba de estrés del checkout: muchos clientes (un hilo y una sesión cada uno) compran a la vez "
+        "las últimas unidades de un mismo producto. Informa pedidos por segundo, bloqueos de la base, "
+        "percentiles de latencia y si el stock final quedó negativo o no cuadra con DetalleVenta. "
+        "Escribe en la base configurada; los datos de la prueba se borran al terminar salvo con --conservar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', type=int, default=50, help="Clientes comprando en paralelo.")
+        parser.add_argument('--stock', type=int, default=20, help="Stock inicial del producto en disputa.")
+        parser.add_argument('--cantidad', type=int, default=1, help="Unidades por pedido.")
+        parser.add_argument('--conservar', action='store_true', help="No borra el producto, clientes ni ventas creados.")
+
+    def handle(self, *args, **options):
+        if options['clientes'] < 1 or options['stock'] < 0 or options['cantidad'] < 1:
+            raise CommandError("--clientes y --cantidad deben ser positivos y --stock no negativo.")
+
+        # Los datos de la prueba no son actividad real: no se escriben en el registro de eventos.
+        with override_settings(EVENTOS_HABILITADOS=False):
+            inconsistencias = self._probar(options)
+
+        if inconsistencias:
+            raise CommandError("Inconsistencias de stock: " + "; ".join(inconsistencias))
+        self.stdout.write(self.style.SUCCESS("Stock consistente: sin sobreventa ni actualizaciones perdidas."))
+
+    def _probar(self, options):
+        marca = uuid.uuid4().hex[:8]
+        sucursales = sucursales_activas()
+        # Con sucursales activas el checkout descuenta de la primera (la sucursal por defecto de la sesión).
+        sucursal = sucursales[0] if sucursales else None
+
+        categoria, categoria_creada = Categoria.objects.get_or_create(nombre='Prueba de estrés')
+        producto = Producto.objects.create(
+            nombre=f"Estrés {marca}", precio=1000, categoria=categoria,
+            stock=0 if sucursal else options['stock'],
+        )
+        if sucursal:
+            StockSucursal.objects.create(sucursal=sucursal, producto=producto, cantidad=options['stock'])
+        registrar_movimientos([MovimientoStock(producto=producto, sucursal=sucursal, cantidad=options['stock'], tipo='INICIAL')])
+
+        usuarios = User.objects.bulk_create([
+            User(username=f"estres_{marca}_{i}") for i in range(options['clientes'])
+        ])
+        Cliente.objects.bulk_create([Cliente(user=usuario) for usuario in usuarios])
+
+        try:
+            # Sin límite de tasa: todos los clientes salen de la misma IP y se quiere medir la base, no el limitador.
+            with override_settings(ALLOWED_HOSTS=['testserver'], LIMITES_TASA={}):
+                resultados, duracion = self._comprar(usuarios, producto, options['cantidad'])
+            inconsistencias = self._informar(resultados, duracion, producto, sucursal, options['stock'], usuarios)
+        finally:
+            if not options['conservar']:
+                Venta.objects.filter(cliente__user__in=usuarios).delete()
+                User.objects.filter(id__in=[u.id for u in usuarios]).delete()
+                producto.delete()
+                if categoria_creada:
+                    categoria.delete()
+        return inconsistencias
+
+    def _comprar(self, usuarios, producto, cantidad):
+        # Sesiones y carritos se preparan antes, en secuencia: solo el checkout corre en paralelo.
+        clientes = []
+        for usuario in usuarios:
+            client = Client(raise_request_exception=False)
+            client.force_login(usuario)
+            client.post(reverse('agregar_a_carrito', args=[producto.id]), {'cantidad': cantidad})
+            clientes.append(client)
+
+        barrera = threading.Barrier(len(clientes) + 1)
+        resultados = []
+        candado = threading.Lock()
+
+        def comprar(client):
+            try:
+                barrera.wait()
+                inicio = time.perf_counter()
+                response = client.get(reverse('finalizar_orden'))
+                latencia = (time.perf_counter() - inicio) * 1000
+                # El view informa los errores con messages; un 500 (p. ej. al guardar la sesión) trae exc_info.
+                textos = [str(m) for m in get_messages(response.wsgi_request)]
+                if response.exc_info:
+                    textos.append(str(response.exc_info[1]))
+                if response.status_code == 302 and response.url == reverse('historial_pedidos'):
+                    estado = 'ok'
+                elif any('locked' in texto for texto in textos):
+                    estado = 'bloqueo'
+                elif any('Stock insuficiente' in texto for texto in textos):
+                    estado = 'agotado'
+                else:
+                    estado = 'error'
+                with candado:
+                    resultados.append((estado, latencia))
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=comprar, args=(client,)) for client in clientes]
+        for hilo in hilos:
+            hilo.start()
+        barrera.wait()
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.join()
+        return resultados, time.perf_counter() - inicio
+
+    def _informar(self, resultados, duracion, producto, sucursal, stock_inicial, usuarios):
+        conteo = {estado: 0 for estado in ('ok', 'agotado', 'bloqueo', 'error')}
+        for estado, _ in resultados:
+            conteo[estado] += 1
+        latencias = sorted(latencia for _, latencia in resultados)
+
+        self.stdout.write(f"{len(resultados)} checkouts concurrentes en {duracion:.2f} s")
+        self.stdout.write(f"  Pedidos completados: {conteo['ok']} ({conteo['ok'] / duracion:.1f} pedidos/s)")
+        self.stdout.write(f"  Rechazados por stock: {conteo['agotado']}")
+        self.stdout.write(f"  Errores de bloqueo de la base: {conteo['bloqueo']}")
+        self.stdout.write(f"  Otros errores: {conteo['error']}")
+        self.stdout.write(
+            "  Latencia (ms): "
+            + ", ".join(f"p{p} {percentil(latencias, p):.0f}" for p in (50, 90, 99))
+            + f", máx {latencias[-1]:.0f}"
+        )
+
+        if sucursal:
+            stock_final = StockSucursal.objects.get(sucursal=sucursal, producto=producto).cantidad
+        else:
+            producto.refresh_from_db(fields=['stock'])
+            stock_final = producto.stock
+        vendidas = DetalleVenta.objects.filter(producto=producto).aggregate(total=Sum('cantidad'))['total'] or 0
+        ventas_vacias = Venta.objects.filter(cliente__user__in=usuarios, detalles__isnull=True).count()
+
+        self.stdout.write(f"  Stock: inicial {stock_inicial}, vendido {vendidas}, final {stock_final}")
+
+        inconsistencias = []
+        if stock_final < 0:
+            inconsistencias.append(f"stock final negativo ({stock_final})")
+        if stock_inicial - vendidas != stock_final:
+            inconsistencias.append(f"inicial - vendido = {stock_inicial - vendidas}, pero el stock final es {stock_final}")
+        if vendidas > stock_inicial:
+            inconsistencias.append(f"sobreventa de {vendidas - stock_inicial} unidad(es)")
+        if ventas_vacias:
+            inconsistencias.append(f"{ventas_vacias} venta(s) sin detalles")
+        return inconsistencias
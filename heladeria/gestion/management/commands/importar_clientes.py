@@ -0,0 +1,201 @@
+import csv
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.contrib.auth.forms import PasswordResetForm
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from gestion.importacion import inicializar_proceso, hashear_password
+from gestion.models import Cliente
+
+
+COLUMNAS_REQUERIDAS = {'email'}
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa clientes desde un CSV (columnas: username, email, first_name, last_name, rut, "
+        "telefono, direccion, password) creando User y Cliente por lotes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del archivo CSV (UTF-8, con encabezados).")
+        parser.add_argument('--lote', type=int, default=2000, help="Clientes por lote/transacción (por defecto 2000).")
+        parser.add_argument('--procesos', type=int, default=None, help="Procesos para hashear contraseñas (por defecto, uno por CPU).")
+        parser.add_argument(
+            '--sin-password', action='store_true',
+            help="Ignora la columna password y deja las cuentas con contraseña inutilizable.",
+        )
+        parser.add_argument(
+            '--enviar-reset', action='store_true',
+            help="Envía un correo de restablecimiento a las cuentas creadas sin contraseña.",
+        )
+        parser.add_argument('--dominio', default='localhost:8000', help="Dominio usado en el enlace de restablecimiento.")
+        parser.add_argument('--https', action='store_true', help="Usa https en el enlace de restablecimiento.")
+
+    def handle(self, *args, **options):
+        self.lote = options['lote']
+        if self.lote <= 0:
+            raise CommandError("--lote debe ser un número positivo.")
+
+        # Se precargan correos y usernames existentes: validar cada fila no cuesta una consulta.
+        self.emails = {e.lower() for e in User.objects.exclude(email='').values_list('email', flat=True)}
+        self.usernames = set(User.objects.values_list('username', flat=True))
+
+        self.ignorar_password = options['sin_password']
+        self.creados = 0
+        self.rechazados = []
+        self.cuentas_sin_password = []
+        inicio = time.monotonic()
+
+        try:
+            archivo = open(options['archivo'], newline='', encoding='utf-8-sig')
+        except OSError as e:
+            raise CommandError(f"No se pudo abrir el archivo: {e}")
+
+        with archivo, ProcessPoolExecutor(max_workers=options['procesos'], initializer=inicializar_proceso) as pool:
+            lector = csv.DictReader(archivo)
+            faltantes = COLUMNAS_REQUERIDAS - set(lector.fieldnames or [])
+            if faltantes:
+                raise CommandError(f"Faltan columnas en el CSV: {', '.join(sorted(faltantes))}")
+
+            numero_fila = 1
+            while True:
+                filas = list(islice(lector, self.lote))
+                if not filas:
+                    break
+
+                validas = []
+                for fila in filas:
+                    numero_fila += 1
+                    datos = self._validar(fila, numero_fila)
+                    if datos is not None:
+                        validas.append(datos)
+
+                self._importar_lote(validas, pool)
+
+                transcurrido = time.monotonic() - inicio
+                self.stdout.write(
+                    f"{numero_fila - 1} filas leídas, {self.creados} clientes creados, "
+                    f"{len(self.rechazados)} rechazadas ({self.creados / max(transcurrido, 1e-6):.0f} clientes/s)"
+                )
+
+        for numero, motivo in self.rechazados[:20]:
+            self.stdout.write(self.style.WARNING(f"Fila {numero}: {motivo}"))
+        if len(self.rechazados) > 20:
+            self.stdout.write(self.style.WARNING(f"... y {len(self.rechazados) - 20} filas rechazadas más."))
+
+        if options['enviar_reset'] and self.cuentas_sin_password:
+            self._enviar_restablecimiento(options['dominio'], 'https' if options['https'] else 'http')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Importación terminada: {self.creados} clientes creados en {time.monotonic() - inicio:.1f} s."
+        ))
+
+    def _validar(self, fila, numero):
+        """Valida una fila contra los correos y usernames precargados; devuelve los datos limpios o None."""
+        email = (fila.get('email') or '').strip()
+        try:
+            validate_email(email)
+        except ValidationError:
+            self.rechazados.append((numero, f"correo inválido '{email}'"))
+            return None
+
+        if email.lower() in self.emails:
+            self.rechazados.append((numero, f"el correo {email} ya está registrado"))
+            return None
+
+        username = (fila.get('username') or '').strip() or email.split('@')[0]
+        username = username[:150]
+        if username in self.usernames:
+            base, sufijo = username[:140], 1
+            while f"{base}{sufijo}" in self.usernames:
+                sufijo += 1
+            username = f"{base}{sufijo}"
+
+        self.emails.add(email.lower())
+        self.usernames.add(username)
+
+        return {
+            'username': username,
+            'email': email,
+            'first_name': (fila.get('first_name') or '').strip()[:150],
+            'last_name': (fila.get('last_name') or '').strip()[:150],
+            'rut': (fila.get('rut') or '').strip()[:15] or None,
+            'telefono': (fila.get('telefono') or '').strip()[:20] or None,
+            'direccion': (fila.get('direccion') or '').strip()[:200] or None,
+            'password': '' if self.ignorar_password else (fila.get('password') or ''),
+        }
+
+    def _importar_lote(self, filas, pool):
+        """Hashea las contraseñas del lote en paralelo y crea User y Cliente en una transacción."""
+        if not filas:
+            return
+
+        con_password = [f for f in filas if f['password']]
+        hashes = pool.map(hashear_password, [f['password'] for f in con_password], chunksize=64)
+        for fila, hash_password in zip(con_password, hashes):
+            fila['hash'] = hash_password
+
+        inutilizable = make_password(None)
+        usuarios = [
+            User(
+                username=f['username'], email=f['email'],
+                first_name=f['first_name'], last_name=f['last_name'],
+                password=f.get('hash', inutilizable),
+            )
+            for f in filas
+        ]
+
+        with transaction.atomic():
+            User.objects.bulk_create(usuarios, batch_size=500)
+
+            if usuarios[0].pk is None:
+                # Backends sin RETURNING: se recuperan los ids por username.
+                ids = dict(User.objects.filter(username__in=[u.username for u in usuarios]).values_list('username', 'id'))
+                for usuario in usuarios:
+                    usuario.pk = usuario.id = ids[usuario.username]
+
+            Cliente.objects.bulk_create(
+                [
+                    Cliente(user=usuario, rut=f['rut'], telefono=f['telefono'], direccion=f['direccion'])
+                    for usuario, f in zip(usuarios, filas)
+                ],
+                batch_size=500,
+            )
+
+        self.creados += len(usuarios)
+        self.cuentas_sin_password.extend(u for u, f in zip(usuarios, filas) if 'hash' not in f)
+
+    def _enviar_restablecimiento(self, dominio, protocolo):
+        """
+        Envía el correo estándar de restablecimiento de Django. No se usa PasswordResetForm.save
+        porque ese formulario omite las cuentas con contraseña inutilizable.
+        """
+        formulario = PasswordResetForm()
+        for usuario in self.cuentas_sin_password:
+            contexto = {
+                'email': usuario.email,
+                'domain': dominio,
+                'site_name': dominio,
+                'uid': urlsafe_base64_encode(force_bytes(usuario.pk)),
+                'user': usuario,
+                'token': default_token_generator.make_token(usuario),
+                'protocol': protocolo,
+            }
+            formulario.send_mail(
+                'registration/password_reset_subject.txt',
+                'registration/password_reset_email.html',
+                contexto, None, usuario.email,
+            )
+
+        self.stdout.write(f"Correos de restablecimiento enviados: {len(self.cuentas_sin_password)}")
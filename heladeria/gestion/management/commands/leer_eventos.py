@@ -0,0 +1,118 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from gestion.eventos import (
+    ARCHIVO_ACTIVO, VENTA_CREADA, STOCK_CAMBIADO, PROMOCION_CAMBIADA,
+    archivos_de_eventos, directorio_eventos, leer_archivo, leer_eventos,
+)
+
+
+def aplicar_evento(estado, evento):
+    """Reconstruye stock, totales de ventas y promociones a partir de los eventos."""
+    datos = evento['datos']
+    if evento['tipo'] == VENTA_CREADA:
+        estado['ventas'] += 1
+        estado['monto_ventas'] += float(datos['total'])
+    elif evento['tipo'] == STOCK_CAMBIADO:
+        clave = f"{datos['producto_id']}@{datos['sucursal_id'] or 'general'}"
+        if 'stock' in datos:
+            estado['stock'][clave] = datos['stock']
+        else:
+            estado['stock'][clave] = estado['stock'].get(clave, 0) + datos['delta']
+    elif evento['tipo'] == PROMOCION_CAMBIADA:
+        if datos['accion'] == 'eliminada':
+            estado['promociones'].pop(str(datos['promocion_id']), None)
+        elif datos['accion'] in ('creada', 'modificada'):
+            estado['promociones'][str(datos['promocion_id'])] = datos
+    estado['ultimo_evento'] = evento['id']
+
+
+class Command(BaseCommand):
+    help = (
+        "Reproduce el registro de eventos (archivos rotados y activo) como JSON por línea. "
+        "Con --seguir queda esperando eventos nuevos; con --estado imprime el estado reconstruido."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help="Id del último evento procesado; se continúa desde el siguiente.")
+        parser.add_argument('--tipo', action='append', help="Filtra por tipo de evento (repetible).")
+        parser.add_argument('--seguir', action='store_true', help="Después de reproducir, sigue el archivo activo.")
+        parser.add_argument('--intervalo', type=float, default=1.0, help="Segundos entre lecturas con --seguir.")
+        parser.add_argument('--estado', action='store_true', help="Imprime el estado reconstruido en vez de los eventos.")
+
+    def handle(self, *args, **options):
+        tipos = set(options['tipo'] or [])
+        estado = {'ventas': 0, 'monto_ventas': 0.0, 'stock': {}, 'promociones': {}, 'ultimo_evento': None}
+
+        def procesar(evento):
+            if tipos and evento['tipo'] not in tipos:
+                return
+            if options['estado']:
+                aplicar_evento(estado, evento)
+            else:
+                self.stdout.write(json.dumps(evento, cls=DjangoJSONEncoder, ensure_ascii=False))
+
+        if not options['seguir'] or options['estado']:
+            for evento in leer_eventos(desde=options['desde']):
+                procesar(evento)
+            if options['estado']:
+                self.stdout.write(json.dumps(estado, indent=2, ensure_ascii=False))
+            return
+
+        # Con --seguir se reproducen los archivos rotados y luego se sigue el activo.
+        desde = options['desde']
+        pendiente = desde is not None
+        for ruta in archivos_de_eventos():
+            if ruta.name == ARCHIVO_ACTIVO:
+                continue
+            for evento in leer_archivo(ruta):
+                if pendiente:
+                    pendiente = evento['id'] != desde
+                    continue
+                procesar(evento)
+
+        self._seguir(procesar, desde if pendiente else None, options['intervalo'])
+
+    def _seguir(self, procesar, saltar_hasta, intervalo):
+        """
+        Lee las líneas nuevas del archivo activo. Si se rota, termina de leer el archivo
+        anterior por el descriptor ya abierto y continúa con el nuevo.
+        """
+        ruta = directorio_eventos() / ARCHIVO_ACTIVO
+        archivo = None
+        try:
+            while True:
+                if archivo is None:
+                    if not ruta.exists():
+                        time.sleep(intervalo)
+                        continue
+                    archivo = open(ruta, 'rb')
+
+                linea = archivo.readline()
+                if linea.endswith(b'\n'):
+                    evento = json.loads(linea)
+                    if saltar_hasta is not None:
+                        # Eventos ya procesados por el consumidor: se saltan hasta el último visto.
+                        if evento['id'] == saltar_hasta:
+                            saltar_hasta = None
+                        continue
+                    procesar(evento)
+                    continue
+
+                # Línea incompleta (o fin del archivo): se vuelve atrás y se espera.
+                archivo.seek(-len(linea), os.SEEK_CUR)
+                if not ruta.exists() or os.stat(ruta).st_ino != os.fstat(archivo.fileno()).st_ino:
+                    archivo.close()
+                    archivo = None
+                    continue
+                self.stdout.flush()
+                time.sleep(intervalo)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if archivo is not None:
+                archivo.close()
@@ -0,0 +1,109 @@
+import time
+from decimal import Decimal
+from statistics import mean
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.template.backends.django import DjangoTemplates
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from gestion.models import Categoria, Producto
+
+
+CARGADORES_SIN_CACHE = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+CARGADORES_CON_CACHE = [
+    ('django.template.loaders.cached.Loader', CARGADORES_SIN_CACHE),
+]
+
+
+def _motor(nombre, cargadores):
+    """Crea un motor de plantillas igual al del proyecto pero con los cargadores indicados."""
+    config = settings.TEMPLATES[0]
+    opciones = dict(config.get('OPTIONS', {}))
+    opciones['loaders'] = cargadores
+    return DjangoTemplates({
+        'NAME': nombre,
+        'DIRS': config.get('DIRS', []),
+        'APP_DIRS': False,
+        'OPTIONS': opciones,
+    })
+
+
+def _catalogo_en_memoria(cantidad):
+    """Arma un catálogo sin tocar la base de datos: categorías, productos y algunas promociones."""
+    categorias = [Categoria(id=i, nombre=nombre) for i, nombre in enumerate(['Helado', 'Pastel', 'Bebida', 'Café'], 1)]
+    productos = [
+        Producto(
+            id=i, nombre=f"Sabor {i}", descripcion="Producto de prueba.",
+            precio=Decimal(1000 + i), stock=1 + i % 50, categoria=categorias[i % len(categorias)],
+        )
+        for i in range(1, cantidad + 1)
+    ]
+
+    agrupados = {}
+    for producto in productos:
+        producto.disponible = producto.stock
+        producto.disponibilidad = []
+        agrupados.setdefault(producto.categoria.nombre, []).append(producto)
+
+    promociones = {
+        producto.id: [{'nombre': 'Oferta', 'descuento': Decimal('10'), 'tipo': 'PORCENTAJE'}]
+        for producto in productos[::10]
+    }
+    return agrupados, promociones
+
+
+class Command(BaseCommand):
+    help = "Mide el tiempo de render de la tienda sobre un catálogo en memoria, con y sin plantillas/fragmentos en caché."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=1000, help="Tamaño del catálogo (por defecto 1000).")
+        parser.add_argument('--repeticiones', type=int, default=20, help="Renders medidos por escenario.")
+
+    def _medir(self, motor, contexto, request, repeticiones):
+        # Un render previo para calentar el cargador y los fragmentos, como en un proceso ya en marcha.
+        motor.get_template('productos/listado.html').render(contexto, request)
+
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            motor.get_template('productos/listado.html').render(contexto, request)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        return mean(tiempos), min(tiempos)
+
+    def handle(self, *args, **options):
+        categorias, promociones = _catalogo_en_memoria(options['productos'])
+
+        request = RequestFactory().get('/tienda/')
+        request.user = User(id=1, username='cliente_benchmark')
+        request.session = {}
+
+        contexto = {
+            'categorias': list(categorias.items()),
+            'promociones_por_producto': promociones,
+            'hoy': '2000-01-01',
+        }
+
+        escenarios = [
+            ("Sin caché", CARGADORES_SIN_CACHE, 'django.core.cache.backends.dummy.DummyCache'),
+            ("Con caché", CARGADORES_CON_CACHE, 'django.core.cache.backends.locmem.LocMemCache'),
+        ]
+
+        resultados = []
+        for nombre, cargadores, backend_fragmentos in escenarios:
+            caches = dict(settings.CACHES)
+            caches['template_fragments'] = {'BACKEND': backend_fragmentos, 'LOCATION': 'benchmark', 'OPTIONS': {'MAX_ENTRIES': 10 * options['productos']}}
+            with override_settings(CACHES=caches):
+                promedio, minimo = self._medir(_motor(nombre, cargadores), contexto, request, options['repeticiones'])
+            resultados.append(promedio)
+            self.stdout.write(f"{nombre}: promedio {promedio:.1f} ms, mínimo {minimo:.1f} ms")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{options['productos']} productos: render {resultados[0] / resultados[1]:.1f}x más rápido con caché."
+        ))
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from gestion.inventario import registrar_movimientos
+from gestion.models import MovimientoStock, Producto, Sucursal, StockSucursal
+
+
+class Command(BaseCommand):
+    help = (
+        "Traspasa el stock general de cada producto (Producto.stock) a una sucursal, "
+        "creando las filas de StockSucursal que falten. Sin --conservar puede repetirse sin duplicar stock."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sucursal', default='Casa Matriz', help="Sucursal de destino; se crea si no existe.")
+        parser.add_argument(
+            '--conservar', action='store_true',
+            help="Copia el stock sin dejar en cero Producto.stock (por defecto se traspasa).",
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        sucursal, creada = Sucursal.objects.get_or_create(nombre=options['sucursal'])
+        if creada:
+            self.stdout.write(f"Sucursal '{sucursal.nombre}' creada.")
+
+        productos = list(Producto.objects.filter(stock__gt=0).values_list('id', 'stock'))
+        existentes = {
+            s.producto_id: s
+            for s in StockSucursal.objects.filter(sucursal=sucursal, producto_id__in=[p for p, _ in productos])
+        }
+
+        nuevos, actualizados = [], []
+        for producto_id, stock in productos:
+            if producto_id in existentes:
+                fila = existentes[producto_id]
+                fila.cantidad += stock
+                actualizados.append(fila)
+            else:
+                nuevos.append(StockSucursal(sucursal=sucursal, producto_id=producto_id, cantidad=stock))
+
+        StockSucursal.objects.bulk_create(nuevos, batch_size=500)
+        StockSucursal.objects.bulk_update(actualizados, ['cantidad'], batch_size=500)
+
+        if not options['conservar']:
+            Producto.objects.filter(id__in=[p for p, _ in productos]).update(stock=0)
+
+        # Las filas nuevas empiezan en cero: su saldo inicial queda en el libro antes del traspaso.
+        movimientos = [
+            MovimientoStock(producto_id=fila.producto_id, sucursal=sucursal, cantidad=0, tipo='INICIAL') for fila in nuevos
+        ]
+        for producto_id, stock in productos:
+            movimientos.append(MovimientoStock(producto_id=producto_id, sucursal=sucursal, cantidad=stock, tipo='TRASPASO'))
+            if not options['conservar']:
+                movimientos.append(MovimientoStock(producto_id=producto_id, cantidad=-stock, tipo='TRASPASO'))
+        registrar_movimientos(movimientos)
+
+        unidades = sum(stock for _, stock in productos)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(productos)} producto(s) y {unidades} unidades traspasadas a '{sucursal.nombre}'."
+        ))
@@ -0,0 +1,77 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from gestion.reconciliacion import (
+    diferencias_stock_general, diferencias_stock_sucursal, diferencias_totales_venta,
+    registrar_saldos_iniciales, reparar,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Audita toda la tienda con consultas agrupadas: stock general y por sucursal contra el libro de "
+        "movimientos, y el total de cada venta contra la suma de sus detalles. Con --reparar corrige las "
+        "diferencias: el libro manda sobre el stock solo donde tiene saldo inicial (historia completa). "
+        "Termina con error si quedan diferencias sin reparar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--saldos-iniciales', action='store_true',
+            help="Antes de auditar, registra el saldo inicial (stock actual menos el libro) de cada stock que aún no lo tiene.",
+        )
+        parser.add_argument('--reparar', action='store_true', help="Corrige las diferencias con bulk_update.")
+        parser.add_argument('--mostrar', type=int, default=10, help="Ejemplos a listar por cada verificación.")
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+
+        if options['saldos_iniciales']:
+            creados = registrar_saldos_iniciales()
+            self.stdout.write(f"{creados} saldo(s) inicial(es) registrados en el libro de stock.")
+
+        productos = list(diferencias_stock_general())
+        stocks_sucursal = list(diferencias_stock_sucursal().select_related('producto', 'sucursal'))
+        ventas = list(diferencias_totales_venta())
+
+        self._listar(
+            "Stock general distinto del libro", productos, options['mostrar'],
+            lambda p: f"#{p.id} {p.nombre}: stock {p.stock}, libro {p.libro}{self._sin_saldo(p)}",
+        )
+        self._listar(
+            "Stock por sucursal distinto del libro", stocks_sucursal, options['mostrar'],
+            lambda s: f"{s.producto.nombre} en {s.sucursal.nombre}: stock {s.cantidad}, libro {s.libro}{self._sin_saldo(s)}",
+        )
+        self._listar(
+            "Ventas con total distinto de sus detalles", ventas, options['mostrar'],
+            lambda v: f"Venta #{v.id}: total {v.total}, detalles {v.suma}",
+        )
+
+        pendientes = len(productos) + len(stocks_sucursal) + len(ventas)
+        if options['reparar'] and pendientes:
+            corregidos = reparar(productos, stocks_sucursal, ventas)
+            self.stdout.write(self.style.SUCCESS(
+                "Reparados: {} producto(s), {} fila(s) de sucursal y {} venta(s).".format(*corregidos)
+            ))
+            pendientes -= sum(corregidos)
+
+        self.stdout.write(f"Auditoría completada en {time.perf_counter() - inicio:.2f} s.")
+        if pendientes:
+            sin_saldo = sum(1 for fila in productos + stocks_sucursal if not fila.con_saldo_inicial)
+            raise CommandError(
+                f"{pendientes} diferencia(s) sin reparar, {sin_saldo} sin saldo inicial "
+                "(usa --reparar; sin saldo inicial corre --saldos-iniciales tras revisarlas; "
+                "un libro negativo requiere revisión manual)."
+            )
+        self.stdout.write(self.style.SUCCESS("Inventario y ventas consistentes."))
+
+    def _sin_saldo(self, fila):
+        return "" if fila.con_saldo_inicial else " (sin saldo inicial)"
+
+    def _listar(self, titulo, filas, limite, describir):
+        self.stdout.write(f"{titulo}: {len(filas)}")
+        for fila in filas[:limite]:
+            self.stdout.write(f"  {describir(fila)}")
+        if len(filas) > limite:
+            self.stdout.write(f"  ... y {len(filas) - limite} más")
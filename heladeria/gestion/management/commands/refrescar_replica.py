@@ -0,0 +1,50 @@
+import os
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+
+class Command(BaseCommand):
+    help = (
+        "Copia la base de datos principal a la réplica de solo lectura usando la API de backup en línea "
+        "de SQLite. Con --cada se repite periódicamente."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cada', type=int, default=0, help="Repite la copia cada N segundos (0 = una sola vez).")
+
+    def handle(self, *args, **options):
+        origen = settings.DATABASES[DEFAULT_DB_ALIAS]
+        if origen['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError("La réplica local solo está disponible cuando la base principal es SQLite.")
+
+        while True:
+            self._copiar(str(origen['NAME']), str(settings.REPLICA_SQLITE))
+            if options['cada'] <= 0:
+                break
+            time.sleep(options['cada'])
+
+    def _copiar(self, ruta_origen, ruta_replica):
+        """
+        Copia a un archivo temporal y lo reemplaza de forma atómica: las conexiones abiertas
+        sobre la réplica anterior terminan su lectura sin ver una copia a medias.
+        """
+        inicio = time.monotonic()
+        temporal = f"{ruta_replica}.tmp"
+
+        origen = sqlite3.connect(ruta_origen)
+        destino = sqlite3.connect(temporal)
+        try:
+            # Un solo paso: la lectura de la base principal no deja entrar escrituras a medio copiar.
+            origen.backup(destino)
+        finally:
+            destino.close()
+            origen.close()
+
+        os.replace(temporal, ruta_replica)
+        self.stdout.write(self.style.SUCCESS(
+            f"Réplica actualizada en {time.monotonic() - inicio:.2f} s ({os.path.getsize(ruta_replica) / 1024:.0f} KB)."
+        ))
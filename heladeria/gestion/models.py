@@ -1,7 +1,6 @@
 from django.db import models
 from django.utils import timezone
 from datetime import timedelta
-from django.db.models import F 
 from django.contrib.auth.models import User 
 from django.core.exceptions import ValidationError 
 
@@ -23,6 +22,12 @@ class Producto(models.Model):
     fecha_vencimiento = models.DateField(blank=True, null=True)
     categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE, related_name="productos")
 
+    class Meta:
+        indexes = [
+            # Orden de la tienda dentro de cada categoría; sirve la paginación por cursor de las secciones.
+            models.Index(fields=['categoria', 'nombre', 'id'], name='producto_categoria_orden_idx'),
+        ]
+
     def __str__(self):
         return self.nombre
     
@@ -121,8 +126,48 @@ class Cliente(models.Model):
 
 
 
+class Sucursal(models.Model):
+    """Local de venta con su propio inventario."""
+    nombre = models.CharField(max_length=100, unique=True)
+    direccion = models.CharField(max_length=200, blank=True, null=True)
+    activa = models.BooleanField(default=True, help_text="Las sucursales inactivas no se ofrecen en la tienda.")
+
+    class Meta:
+        verbose_name_plural = "Sucursales"
+        ordering = ['nombre']
+
+    def __str__(self):
+        return self.nombre
+
+
+class StockSucursal(models.Model):
+    """
+    Stock de un producto en una sucursal. Cada sucursal descuenta su propia fila,
+    así las compras en distintos locales no compiten por la misma fila de Producto.
+    """
+    sucursal = models.ForeignKey(Sucursal, on_delete=models.CASCADE, related_name="stocks")
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="stocks_sucursal")
+    cantidad = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Stock por Sucursal"
+        verbose_name_plural = "Stock por Sucursal"
+        constraints = [
+            models.UniqueConstraint(fields=['sucursal', 'producto'], name='stock_unico_por_sucursal'),
+        ]
+
+    def __str__(self):
+        return f"{self.producto.nombre} en {self.sucursal.nombre}: {self.cantidad}"
+
+
+
+
 class Venta(models.Model):
     cliente = models.ForeignKey(Cliente, on_delete=models.SET_NULL, null=True, related_name="ventas") 
+    sucursal = models.ForeignKey(
+        Sucursal, on_delete=models.SET_NULL, blank=True, null=True, related_name="ventas",
+        help_text="Sucursal desde la que se descuenta el stock (vacío = stock general del producto)."
+    )
     fecha_venta = models.DateTimeField(auto_now_add=True)
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
 
@@ -153,19 +198,248 @@ class DetalleVenta(models.Model):
 
     def save(self, *args, **kwargs):
         """
-        Calcula subtotal, guarda el precio unitario, actualiza el stock con F-expressions
-        y recalcula el total de la Venta.
+        Calcula subtotal, guarda el precio unitario, descuenta el stock (solo al crear el detalle,
+        desde la sucursal de la venta si la tiene) y recalcula el total de la Venta.
         """
-        
+        from .inventario import descontar_stock
+
         if not self.pk: 
 
             if not self.precio_unitario:
                     self.precio_unitario = self.producto.precio
+
+            descontar_stock(self.producto, self.cantidad, sucursal_id=self.venta.sucursal_id, venta=self.venta)
         
         self.subtotal = self.precio_unitario * self.cantidad
         
         super().save(*args, **kwargs)
         
-        Producto.objects.filter(pk=self.producto_id).update(stock=F('stock') - self.cantidad)
-        
         self.venta.calcular_total()
+
+
+class EfectividadPromocion(models.Model):
+    """
+    Resultado del análisis de efectividad de una promoción: ventas dentro de su vigencia
+    frente a una ventana base de igual duración inmediatamente anterior.
+    """
+    promocion = models.OneToOneField(Promocion, on_delete=models.CASCADE, primary_key=True, related_name="efectividad")
+
+    unidades_promocion = models.PositiveIntegerField(default=0)
+    ingresos_promocion = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    unidades_base = models.PositiveIntegerField(default=0)
+    ingresos_base = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    costo_descuento = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0,
+        help_text="Diferencia entre el precio de lista y el precio cobrado durante la promoción."
+    )
+    uplift = models.FloatField(
+        blank=True, null=True,
+        help_text="Variación porcentual de ingresos respecto a la ventana base (vacío si no hubo ventas base)."
+    )
+    calculado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Efectividad de Promoción"
+        verbose_name_plural = "Efectividad de Promociones"
+
+    def __str__(self):
+        return f"Efectividad de {self.promocion.nombre}"
+
+
+class VentaArchivada(models.Model):
+    """
+    Venta antigua movida fuera de Venta por `archivar_ventas`. Conserva el id original
+    para que los números de pedido que ve el cliente no cambien.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    cliente = models.ForeignKey(Cliente, on_delete=models.SET_NULL, null=True, related_name="ventas_archivadas")
+    sucursal = models.ForeignKey(Sucursal, on_delete=models.SET_NULL, blank=True, null=True, related_name="ventas_archivadas")
+    fecha_venta = models.DateTimeField(db_index=True)
+    total = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    archivada_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Venta Archivada"
+        verbose_name_plural = "Ventas Archivadas"
+
+    def __str__(self):
+        return f"Venta archivada #{self.id}"
+
+
+class DetalleVentaArchivado(models.Model):
+    venta = models.ForeignKey(VentaArchivada, on_delete=models.CASCADE, related_name="detalles")
+    producto = models.ForeignKey(Producto, on_delete=models.SET_NULL, null=True)
+    producto_nombre = models.CharField(max_length=100, help_text="Nombre del producto al momento de archivar.")
+    cantidad = models.PositiveIntegerField()
+    precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        verbose_name = "Detalle de Venta Archivado"
+        verbose_name_plural = "Detalles de Venta Archivados"
+
+    def __str__(self):
+        return f"{self.producto_nombre} x {self.cantidad} en Venta archivada #{self.venta_id}"
+
+
+class ResumenArchivoDiario(models.Model):
+    """Totales diarios de las ventas archivadas; los reportes los suman a los de Venta."""
+    fecha = models.DateField(primary_key=True)
+    ventas = models.PositiveIntegerField(default=0)
+    monto = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Resumen Diario Archivado"
+        verbose_name_plural = "Resúmenes Diarios Archivados"
+
+
+class ResumenArchivoCliente(models.Model):
+    cliente = models.OneToOneField(Cliente, on_delete=models.CASCADE, primary_key=True, related_name="resumen_archivo")
+    ordenes = models.PositiveIntegerField(default=0)
+    monto = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    ultima_compra = models.DateTimeField(blank=True, null=True)
+
+
+class ResumenArchivoProducto(models.Model):
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, primary_key=True, related_name="resumen_archivo")
+    unidades = models.PositiveIntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+
+class PerfilSolicitud(models.Model):
+    """Petición ejecutada bajo cProfile por PerfiladoMiddleware; el perfil queda en PERFILES_DIR."""
+    ORIGEN_CHOICES = [
+        ('STAFF', 'Solicitado por staff'),
+        ('MUESTREO', 'Muestreo de anónimos'),
+    ]
+
+    archivo = models.CharField(max_length=100, unique=True)
+    metodo = models.CharField(max_length=10)
+    ruta = models.CharField(max_length=500)
+    estado = models.PositiveSmallIntegerField(verbose_name="Código HTTP")
+    duracion_ms = models.FloatField(verbose_name="Duración (ms)")
+    origen = models.CharField(max_length=10, choices=ORIGEN_CHOICES)
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True)
+    creado_en = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Perfil de Solicitud"
+        verbose_name_plural = "Perfiles de Solicitudes"
+        ordering = ['-creado_en']
+
+    def __str__(self):
+        return f"{self.metodo} {self.ruta} ({self.duracion_ms:.0f} ms)"
+
+
+class SegmentoCliente(models.Model):
+    """
+    Puntajes RFM (recencia, frecuencia y monto, de 1 a 5 por quintiles) y segmento del cliente,
+    calculados por el comando `calcular_rfm`. Solo existen para clientes con compras.
+    """
+    SEGMENTO_CHOICES = [
+        ('CAMPEONES', 'Campeones'),
+        ('LEALES', 'Leales'),
+        ('NUEVOS', 'Nuevos'),
+        ('POTENCIALES', 'Potenciales'),
+        ('EN_RIESGO', 'En riesgo'),
+        ('HIBERNANDO', 'Hibernando'),
+        ('PERDIDOS', 'Perdidos'),
+    ]
+
+    cliente = models.OneToOneField(Cliente, on_delete=models.CASCADE, primary_key=True, related_name="segmento")
+    ultima_compra = models.DateTimeField()
+    recencia_dias = models.PositiveIntegerField()
+    frecuencia = models.PositiveIntegerField()
+    monto = models.DecimalField(max_digits=14, decimal_places=2)
+    puntaje_r = models.PositiveSmallIntegerField()
+    puntaje_f = models.PositiveSmallIntegerField()
+    puntaje_m = models.PositiveSmallIntegerField()
+    rfm = models.CharField(max_length=3, help_text="Puntajes concatenados, p. ej. '545'.")
+    segmento = models.CharField(max_length=20, choices=SEGMENTO_CHOICES, db_index=True)
+    calculado_en = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Segmento de Cliente"
+        verbose_name_plural = "Segmentos de Clientes"
+
+    def __str__(self):
+        return f"{self.cliente} - {self.get_segmento_display()} ({self.rfm})"
+
+
+class PronosticoProducto(models.Model):
+    """
+    Demanda diaria pronosticada (suavizado exponencial de las unidades vendidas por día) y
+    sugerencia de reposición del producto, calculadas por el comando `calcular_pronosticos`.
+    """
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, primary_key=True, related_name="pronostico")
+    demanda_diaria = models.FloatField(help_text="Unidades por día pronosticadas.")
+    unidades_historia = models.PositiveIntegerField(default=0, help_text="Unidades vendidas en el período analizado.")
+    stock_actual = models.IntegerField(help_text="Stock general más sucursales al momento del cálculo.")
+    dias_cobertura = models.FloatField(null=True, blank=True, help_text="Días que alcanza el stock; vacío si no hay demanda.")
+    cantidad_reponer = models.PositiveIntegerField(default=0)
+    unidades_en_riesgo = models.PositiveIntegerField(
+        default=0, help_text="Unidades que, al ritmo pronosticado, no se venderían antes del vencimiento."
+    )
+    riesgo_merma = models.BooleanField(default=False, db_index=True)
+    calculado_en = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Pronóstico de Producto"
+        verbose_name_plural = "Pronósticos de Productos"
+
+    def __str__(self):
+        return f"{self.producto.nombre}: {self.demanda_diaria:.1f} u/día"
+
+
+class MovimientoStock(models.Model):
+    """
+    Libro de movimientos de stock: solo se agregan filas. Cada cambio de Producto.stock (sucursal
+    vacía) o de StockSucursal.cantidad deja aquí su diferencia, así que la suma por producto y
+    sucursal debe igualar el stock actual; lo verifica el comando `reconciliar_inventario`.
+    """
+    TIPO_CHOICES = [
+        ('INICIAL', 'Saldo inicial'),
+        ('VENTA', 'Venta'),
+        ('AJUSTE', 'Ajuste manual'),
+        ('CARGA', 'Carga de CSV'),
+        ('TRASPASO', 'Traspaso a sucursal'),
+    ]
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="movimientos_stock")
+    sucursal = models.ForeignKey(
+        Sucursal, on_delete=models.CASCADE, blank=True, null=True, related_name="movimientos_stock",
+        help_text="Vacío = stock general del producto."
+    )
+    cantidad = models.IntegerField(help_text="Diferencia: negativa al descontar, positiva al reponer.")
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    venta = models.ForeignKey(Venta, on_delete=models.SET_NULL, blank=True, null=True, related_name="movimientos_stock")
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True)
+    creado_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Movimiento de Stock"
+        verbose_name_plural = "Movimientos de Stock"
+        indexes = [
+            models.Index(fields=['producto', 'sucursal'], name='movimiento_producto_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.cantidad:+d} de {self.producto.nombre}"
+
+
+class VersionDatos(models.Model):
+    """
+    Contadores de versión compartidos por todos los procesos (ver gestion/versiones.py): se
+    guardan en la base y no en la caché local de cada proceso para que un cambio en uno
+    invalide las cachés e índices de los demás.
+    """
+    clave = models.CharField(max_length=50, primary_key=True)
+    valor = models.BigIntegerField()
+
+    class Meta:
+        verbose_name = "Versión de Datos"
+        verbose_name_plural = "Versiones de Datos"
+
+    def __str__(self):
+        return f"{self.clave}: {self.valor}"
@@ -0,0 +1,135 @@
+import cProfile
+import io
+import pstats
+import random
+import time
+import uuid
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+
+PARAMETRO_PERFILADO = 'perfilar'
+CABECERA_PERFILADO = 'HTTP_X_PERFILAR'
+
+
+def directorio_perfiles():
+    directorio = Path(settings.PERFILES_DIR)
+    directorio.mkdir(parents=True, exist_ok=True)
+    return directorio
+
+
+def funciones_principales(archivo, limite=30, orden='cumulative'):
+    """
+    Lee un perfil guardado y devuelve sus funciones más costosas como diccionarios
+    (función, llamadas, tiempo propio y acumulado en ms), ordenadas por `orden`.
+    """
+    estadisticas = pstats.Stats(str(Path(settings.PERFILES_DIR) / archivo), stream=io.StringIO())
+    estadisticas.sort_stats(orden)
+
+    filas = []
+    for funcion in estadisticas.fcn_list[:limite]:
+        llamadas_primitivas, llamadas, tiempo_propio, tiempo_acumulado, _ = estadisticas.stats[funcion]
+        ruta, linea, nombre = funcion
+        filas.append({
+            'funcion': f"{Path(ruta).name}:{linea}({nombre})" if linea else nombre,
+            'llamadas': llamadas if llamadas == llamadas_primitivas else f"{llamadas}/{llamadas_primitivas}",
+            'propio_ms': tiempo_propio * 1000,
+            'acumulado_ms': tiempo_acumulado * 1000,
+        })
+    return filas
+
+
+class PerfiladoMiddleware:
+    """
+    Ejecuta la petición bajo cProfile cuando un usuario staff lo pide (?perfilar=1 o la
+    cabecera X-Perfilar: 1), o por muestreo de tráfico anónimo según PERFILADO_TASA_ANONIMOS.
+    El perfil se guarda en PERFILES_DIR y queda registrado en PerfilSolicitud (admin).
+    Sin perfilado, el costo es una búsqueda en request.GET y en las cabeceras.
+
+    Bajo ASGI no agrega un cambio de hilo; el perfil de una petición asíncrona se toma en el
+    hilo del event loop y puede incluir otras tareas que corrieron mientras esperaba.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.tasa_anonimos = getattr(settings, 'PERFILADO_TASA_ANONIMOS', 0)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        origen = self._origen(request, request.user)
+        if origen is None:
+            return self.get_response(request)
+
+        perfil = cProfile.Profile()
+        inicio = time.perf_counter()
+        perfil.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            perfil.disable()
+        duracion_ms = (time.perf_counter() - inicio) * 1000
+
+        registro = self._guardar(perfil, request, request.user, response, origen, duracion_ms)
+        if origen == 'STAFF':
+            response['X-Perfil-Id'] = str(registro.pk)
+        return response
+
+    async def __acall__(self, request):
+        # El usuario se carga solo si hay algo que decidir: la sesión no se lee en cada petición.
+        if not (self.tasa_anonimos or self._pedido(request)):
+            return await self.get_response(request)
+
+        usuario = await request.auser()
+        origen = self._origen(request, usuario)
+        if origen is None:
+            return await self.get_response(request)
+
+        perfil = cProfile.Profile()
+        inicio = time.perf_counter()
+        perfil.enable()
+        try:
+            response = await self.get_response(request)
+        finally:
+            perfil.disable()
+        duracion_ms = (time.perf_counter() - inicio) * 1000
+
+        registro = await sync_to_async(self._guardar)(perfil, request, usuario, response, origen, duracion_ms)
+        if origen == 'STAFF':
+            response['X-Perfil-Id'] = str(registro.pk)
+        return response
+
+    def _pedido(self, request):
+        return PARAMETRO_PERFILADO in request.GET or CABECERA_PERFILADO in request.META
+
+    def _origen(self, request, usuario):
+        if self._pedido(request):
+            return 'STAFF' if usuario.is_staff else None
+        if self.tasa_anonimos and not usuario.is_authenticated and random.random() < self.tasa_anonimos:
+            return 'MUESTREO'
+        return None
+
+    def _guardar(self, perfil, request, usuario, response, origen, duracion_ms):
+        from .models import PerfilSolicitud
+
+        archivo = f"{timezone.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}.prof"
+        perfil.dump_stats(str(directorio_perfiles() / archivo))
+
+        return PerfilSolicitud.objects.create(
+            archivo=archivo,
+            metodo=request.method,
+            ruta=request.get_full_path()[:500],
+            estado=response.status_code,
+            duracion_ms=duracion_ms,
+            origen=origen,
+            usuario=usuario if usuario.is_authenticated else None,
+        )
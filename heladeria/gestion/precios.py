@@ -0,0 +1,135 @@
+import csv
+import io
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .eventos import publicar_stock
+from .inventario import registrar_movimientos
+from .models import MovimientoStock, Producto
+from .versiones import incrementar_version_catalogo
+
+
+CAMPOS_ACTUALIZABLES = ('precio', 'stock')
+
+
+def leer_lista_precios(texto):
+    """
+    Lee un CSV con columna 'id' (o 'nombre') y las columnas 'precio' y/o 'stock'.
+    Devuelve (filas, errores), donde cada fila es un dict con la clave y los valores ya convertidos.
+    """
+    lector = csv.DictReader(io.StringIO(texto))
+    columnas = set(lector.fieldnames or [])
+
+    if not columnas & {'id', 'nombre'}:
+        return [], ["El archivo debe tener una columna 'id' o 'nombre'."]
+    if not columnas & set(CAMPOS_ACTUALIZABLES):
+        return [], ["El archivo debe tener al menos una columna 'precio' o 'stock'."]
+
+    filas, errores = [], []
+    for numero, fila in enumerate(lector, start=2):
+        datos = {}
+        try:
+            if (fila.get('id') or '').strip():
+                datos['id'] = int(fila['id'])
+            elif (fila.get('nombre') or '').strip():
+                datos['nombre'] = fila['nombre'].strip()
+            else:
+                raise ValueError("falta el id o nombre del producto")
+
+            if (fila.get('precio') or '').strip():
+                datos['precio'] = Decimal(fila['precio'].strip()).quantize(Decimal('0.01'))
+                if datos['precio'] < 0:
+                    raise ValueError("el precio no puede ser negativo")
+
+            if (fila.get('stock') or '').strip():
+                datos['stock'] = int(fila['stock'])
+                if datos['stock'] < 0:
+                    raise ValueError("el stock no puede ser negativo")
+        except (ValueError, InvalidOperation) as e:
+            errores.append(f"Fila {numero}: {e}")
+            continue
+
+        filas.append(datos)
+
+    return filas, errores
+
+
+def calcular_cambios(filas):
+    """
+    Compara las filas con los productos actuales (una consulta por tipo de clave) y
+    devuelve (cambios, errores). Cada cambio lista solo los campos que realmente varían.
+    """
+    ids = [f['id'] for f in filas if 'id' in f]
+    nombres = [f['nombre'] for f in filas if 'nombre' in f]
+
+    por_id = Producto.objects.in_bulk(ids) if ids else {}
+    por_nombre = {}
+    if nombres:
+        for producto in Producto.objects.filter(nombre__in=nombres):
+            por_nombre.setdefault(producto.nombre, []).append(producto)
+
+    cambios, errores = [], []
+    for fila in filas:
+        if 'id' in fila:
+            producto = por_id.get(fila['id'])
+            if producto is None:
+                errores.append(f"No existe un producto con id {fila['id']}.")
+                continue
+        else:
+            coincidencias = por_nombre.get(fila['nombre'], [])
+            if len(coincidencias) != 1:
+                errores.append(f"El nombre '{fila['nombre']}' coincide con {len(coincidencias)} productos.")
+                continue
+            producto = coincidencias[0]
+
+        campos = {
+            campo: (getattr(producto, campo), fila[campo])
+            for campo in CAMPOS_ACTUALIZABLES
+            if campo in fila and getattr(producto, campo) != fila[campo]
+        }
+        if campos:
+            cambios.append({'producto': producto, 'campos': campos})
+
+    return cambios, errores
+
+
+@transaction.atomic
+def aplicar_cambios(cambios, usuario=None):
+    """
+    Aplica los cambios con bulk_update (uno por combinación de campos modificados, así cada
+    producto solo escribe lo que cambia) y luego invalida una vez el catálogo (bulk_update no
+    dispara señales por producto). Las diferencias de stock van al libro de stock.
+    """
+    if not cambios:
+        return 0
+
+    # El stock "anterior" de calcular_cambios se leyó sin bloqueo: la diferencia para el libro se
+    # toma del valor actual con la fila bloqueada, por si una venta se confirmó entre tanto.
+    stock_actual = dict(
+        Producto.objects.select_for_update()
+        .filter(id__in=[c['producto'].pk for c in cambios if 'stock' in c['campos']])
+        .values_list('id', 'stock')
+    )
+
+    grupos = {}
+    movimientos = []
+    for cambio in cambios:
+        producto = cambio['producto']
+        for campo, (anterior, nuevo) in cambio['campos'].items():
+            setattr(producto, campo, nuevo)
+            if campo == 'stock':
+                anterior = stock_actual.get(producto.pk, anterior)
+                movimientos.append(MovimientoStock(producto=producto, cantidad=nuevo - anterior, tipo='CARGA', usuario=usuario))
+        # Un producto que solo cambia de precio no debe escribir su stock leído antes: pisaría
+        # las ventas confirmadas entre tanto.
+        grupos.setdefault(tuple(sorted(cambio['campos'])), []).append(producto)
+
+    for campos, productos in grupos.items():
+        Producto.objects.bulk_update(productos, campos, batch_size=500)
+    registrar_movimientos(movimientos)
+    transaction.on_commit(incrementar_version_catalogo)
+    for cambio in cambios:
+        if 'stock' in cambio['campos']:
+            publicar_stock(cambio['producto'].id, stock=cambio['producto'].stock)
+    return len(cambios)
@@ -0,0 +1,115 @@
+import math
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import transaction
+from django.utils import timezone
+
+from .inventario import con_stock_total
+from .models import DetalleVenta, Producto, PronosticoProducto, Venta
+
+
+ALFA = 0.2
+DIAS_HISTORIA = 365
+PLAZO_REPOSICION_DIAS = 3
+DIAS_COBERTURA_OBJETIVO = 14
+TAMANO_LOTE = 5000
+
+
+def suavizar(ventas, inicio, fin, alfa=ALFA):
+    """
+    Nivel del suavizado exponencial simple de las unidades diarias entre `inicio` y `fin`
+    (inclusive). `ventas` son pares (día, unidades) ordenados, solo de los días con ventas:
+    un tramo de n días sin ventas equivale a multiplicar el nivel por (1 - alfa) ** n, así que
+    se aplica de una vez. El nivel arranca en el promedio diario del período.
+    """
+    nivel = sum(unidades for _, unidades in ventas) / ((fin - inicio).days + 1)
+    anterior = inicio - timedelta(days=1)
+    for dia, unidades in ventas:
+        nivel *= (1 - alfa) ** ((dia - anterior).days - 1)
+        nivel = alfa * unidades + (1 - alfa) * nivel
+        anterior = dia
+    return nivel * (1 - alfa) ** (fin - anterior).days
+
+
+def _ventas_diarias(inicio, fin):
+    """
+    Genera (producto_id, [(día, unidades), ...]) para los productos con ventas entre `inicio` y
+    `fin`. El día local se calcula una vez por venta y no por detalle (en SQLite TruncDate corre
+    en Python fila a fila); los detalles se leen como enteros, ordenados por producto.
+    """
+    tz = timezone.get_current_timezone()
+    ventas = Venta.objects.filter(
+        fecha_venta__gte=timezone.make_aware(datetime.combine(inicio, time.min), tz),
+        fecha_venta__lt=timezone.make_aware(datetime.combine(fin + timedelta(days=1), time.min), tz),
+    )
+    dia_de_venta = {
+        venta_id: timezone.localtime(fecha, tz).date()
+        for venta_id, fecha in ventas.values_list('id', 'fecha_venta').iterator(chunk_size=TAMANO_LOTE)
+    }
+
+    filas = (
+        DetalleVenta.objects
+        .filter(venta__in=ventas)
+        .order_by('producto_id')
+        .values_list('producto_id', 'venta_id', 'cantidad')
+    )
+    for producto_id, grupo in groupby(filas.iterator(chunk_size=TAMANO_LOTE), key=itemgetter(0)):
+        unidades = defaultdict(int)
+        for _, venta_id, cantidad in grupo:
+            unidades[dia_de_venta[venta_id]] += cantidad
+        yield producto_id, sorted(unidades.items())
+
+
+def calcular_pronosticos(dias=DIAS_HISTORIA, alfa=ALFA):
+    """
+    Pronostica la demanda diaria de cada producto con las ventas de los últimos `dias` días
+    completos y la cruza con el stock total y el vencimiento: cuánto reponer para cubrir el plazo
+    de reposición más los días objetivo, y cuántas unidades no alcanzarían a venderse antes de
+    vencer. Reemplaza los pronósticos anteriores; devuelve la cantidad guardada.
+    """
+    ahora = timezone.now()
+    hoy = timezone.localdate(ahora)
+    fin = hoy - timedelta(days=1)
+    inicio = hoy - timedelta(days=dias)
+
+    demanda = {}
+    historia = {}
+    for producto_id, ventas in _ventas_diarias(inicio, fin):
+        demanda[producto_id] = suavizar(ventas, inicio, fin, alfa)
+        historia[producto_id] = sum(unidades for _, unidades in ventas)
+
+    pronosticos = []
+    productos = con_stock_total(Producto.objects.all()).values_list('id', 'stock_total', 'fecha_vencimiento')
+    for producto_id, stock, vencimiento in productos.iterator(chunk_size=TAMANO_LOTE):
+        diaria = demanda.get(producto_id, 0.0)
+        disponible = max(stock, 0)
+
+        objetivo = diaria * (PLAZO_REPOSICION_DIAS + DIAS_COBERTURA_OBJETIVO)
+        reponer = max(math.ceil(objetivo - disponible), 0)
+
+        en_riesgo = 0
+        if vencimiento and disponible:
+            # Se puede vender hasta el mismo día del vencimiento.
+            dias_venta = max((vencimiento - hoy).days + 1, 0)
+            en_riesgo = max(math.floor(disponible - diaria * dias_venta), 0)
+
+        pronosticos.append(PronosticoProducto(
+            producto_id=producto_id,
+            demanda_diaria=diaria,
+            unidades_historia=historia.get(producto_id, 0),
+            stock_actual=stock,
+            dias_cobertura=disponible / diaria if diaria > 0 else None,
+            cantidad_reponer=reponer,
+            unidades_en_riesgo=en_riesgo,
+            riesgo_merma=en_riesgo > 0,
+            calculado_en=ahora,
+        ))
+
+    with transaction.atomic():
+        PronosticoProducto.objects.all().delete()
+        PronosticoProducto.objects.bulk_create(pronosticos, batch_size=1000)
+
+    return len(pronosticos)
@@ -0,0 +1,146 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .eventos import publicar_stock
+from .models import MovimientoStock, Producto, StockSucursal, Venta
+from .versiones import incrementar_version_catalogo
+
+
+# Los montos se comparan con tolerancia de medio centavo (en SQLite las sumas decimales son de punto flotante).
+TOLERANCIA_MONTO = Decimal('0.005')
+TAMANO_LOTE = 1000
+
+
+def _libro_sucursal():
+    """Suma del libro para el (producto, sucursal) de la fila externa de StockSucursal."""
+    return Subquery(
+        MovimientoStock.objects
+        .filter(producto_id=OuterRef('producto_id'), sucursal_id=OuterRef('sucursal_id'))
+        .values('producto_id')
+        .annotate(total=Sum('cantidad'))
+        .values('total')
+    )
+
+
+def _saldo_inicial(producto, sucursal):
+    """Si el (producto, sucursal) de la fila externa tiene saldo inicial, es decir, su historia completa en el libro."""
+    return Exists(MovimientoStock.objects.filter(producto_id=producto, sucursal_id=sucursal, tipo='INICIAL'))
+
+
+def _libro_general(queryset):
+    return queryset.annotate(libro=Coalesce(
+        Sum('movimientos_stock__cantidad', filter=Q(movimientos_stock__sucursal__isnull=True)), Value(0),
+    ))
+
+
+def diferencias_stock_general():
+    """
+    Productos cuyo stock general no coincide con la suma de sus movimientos sin sucursal (una
+    consulta). 'con_saldo_inicial' indica si el libro tiene su historia completa.
+    """
+    return (
+        _libro_general(Producto.objects)
+        .annotate(con_saldo_inicial=_saldo_inicial(OuterRef('pk'), None))
+        .exclude(stock=F('libro'))
+        .order_by('id')
+    )
+
+
+def diferencias_stock_sucursal():
+    """Filas de StockSucursal cuya cantidad no coincide con el libro de su producto y sucursal."""
+    return (
+        StockSucursal.objects
+        .annotate(
+            libro=Coalesce(_libro_sucursal(), Value(0)),
+            con_saldo_inicial=_saldo_inicial(OuterRef('producto_id'), OuterRef('sucursal_id')),
+        )
+        .exclude(cantidad=F('libro'))
+        .order_by('id')
+    )
+
+
+def diferencias_totales_venta():
+    """Ventas cuyo total no coincide con la suma de los subtotales de sus detalles."""
+    return (
+        Venta.objects
+        .annotate(suma=Coalesce(Sum('detalles__subtotal'), Value(Decimal('0'))))
+        .filter(Q(total__gt=F('suma') + TOLERANCIA_MONTO) | Q(total__lt=F('suma') - TOLERANCIA_MONTO))
+        .order_by('id')
+    )
+
+
+@transaction.atomic
+def registrar_saldos_iniciales(usuario=None):
+    """
+    Agrega un movimiento INICIAL a cada stock (general o por sucursal) que aún no lo tiene: el
+    stock actual menos lo que ya suma el libro, que es el saldo que había antes del primer
+    movimiento registrado. Stock y libro se leen en la misma consulta, así que una venta
+    simultánea no descuadra el saldo. Devuelve la cantidad de movimientos creados.
+    """
+    sin_inicial_general = (
+        _libro_general(Producto.objects)
+        .exclude(_saldo_inicial(OuterRef('pk'), None))
+        .values_list('id', 'stock', 'libro')
+    )
+    sin_inicial_sucursal = (
+        StockSucursal.objects
+        .annotate(libro=Coalesce(_libro_sucursal(), Value(0)))
+        .exclude(_saldo_inicial(OuterRef('producto_id'), OuterRef('sucursal_id')))
+        .values_list('producto_id', 'sucursal_id', 'cantidad', 'libro')
+    )
+
+    movimientos = [
+        MovimientoStock(producto_id=producto_id, cantidad=stock - libro, tipo='INICIAL', usuario=usuario)
+        for producto_id, stock, libro in sin_inicial_general.iterator(chunk_size=TAMANO_LOTE)
+    ]
+    movimientos += [
+        MovimientoStock(
+            producto_id=producto_id, sucursal_id=sucursal_id, cantidad=cantidad - libro, tipo='INICIAL', usuario=usuario,
+        )
+        for producto_id, sucursal_id, cantidad, libro in sin_inicial_sucursal.iterator(chunk_size=TAMANO_LOTE)
+    ]
+    # Los saldos en cero también se guardan: marcan que la historia de ese stock está completa.
+    return len(MovimientoStock.objects.bulk_create(movimientos, batch_size=TAMANO_LOTE))
+
+
+def reparable(fila):
+    """
+    Una diferencia de stock se corrige sola solo si el libro tiene la historia completa (saldo
+    inicial) y no es negativo; si no, el libro no sabe más que el stock y se deja para revisión.
+    """
+    return fila.con_saldo_inicial and fila.libro >= 0
+
+
+@transaction.atomic
+def reparar(productos, stocks_sucursal, ventas):
+    """
+    Corrige con bulk_update las diferencias ya detectadas: el stock reparable toma el valor del
+    libro y el total de cada venta, la suma de sus detalles. Devuelve (productos, filas de
+    sucursal, ventas) corregidos.
+    """
+    productos = [p for p in productos if reparable(p)]
+    for producto in productos:
+        producto.stock = producto.libro
+    Producto.objects.bulk_update(productos, ['stock'], batch_size=TAMANO_LOTE)
+
+    stocks_sucursal = [s for s in stocks_sucursal if reparable(s)]
+    for fila in stocks_sucursal:
+        fila.cantidad = fila.libro
+    StockSucursal.objects.bulk_update(stocks_sucursal, ['cantidad'], batch_size=TAMANO_LOTE)
+
+    for venta in ventas:
+        venta.total = venta.suma
+    Venta.objects.bulk_update(ventas, ['total'], batch_size=TAMANO_LOTE)
+
+    # bulk_update no dispara señales: se invalida el catálogo y se publican los stocks corregidos.
+    if productos or stocks_sucursal:
+        transaction.on_commit(incrementar_version_catalogo)
+    for producto in productos:
+        publicar_stock(producto.pk, stock=producto.stock)
+    for fila in stocks_sucursal:
+        publicar_stock(fila.producto_id, sucursal_id=fila.sucursal_id, stock=fila.cantidad)
+
+    return len(productos), len(stocks_sucursal), len(ventas)
@@ -0,0 +1,107 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+ALIAS_REPLICA = 'replica'
+
+_leer_de_replica = ContextVar('leer_de_replica', default=False)
+
+
+def replica_disponible():
+    """
+    La réplica se usa solo si está configurada, ya fue generada al menos una vez y la conexión
+    apunta a ella (en los tests la réplica es un espejo de 'default' y no se enruta).
+    """
+    if ALIAS_REPLICA not in settings.DATABASES:
+        return False
+    return (
+        str(settings.REPLICA_SQLITE) in str(connections[ALIAS_REPLICA].settings_dict['NAME'])
+        and os.path.exists(settings.REPLICA_SQLITE)
+    )
+
+
+def estado_replica():
+    """Fecha de la última copia y si supera la antigüedad máxima configurada."""
+    if not replica_disponible():
+        return {'disponible': False}
+
+    actualizada = os.path.getmtime(settings.REPLICA_SQLITE)
+    antiguedad = int(time.time() - actualizada)
+    return {
+        'disponible': True,
+        'actualizada': actualizada,
+        'antiguedad_minutos': antiguedad // 60,
+        'desactualizada': antiguedad > settings.REPLICA_MAX_ANTIGUEDAD_SEGUNDOS,
+    }
+
+
+@contextmanager
+def leyendo_de_replica():
+    """Dentro del bloque, las lecturas del ORM van a la réplica (si existe); las escrituras siguen en 'default'."""
+    token = _leer_de_replica.set(True)
+    try:
+        yield
+    finally:
+        _leer_de_replica.reset(token)
+
+
+def usar_replica(vista):
+    """
+    Decorador para vistas de reportes: las peticiones GET leen de la réplica. La respuesta
+    se renderiza dentro del bloque para que las consultas perezosas de la plantilla también vayan a la réplica.
+    """
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return vista(request, *args, **kwargs)
+
+        with leyendo_de_replica():
+            respuesta = vista(request, *args, **kwargs)
+            if hasattr(respuesta, 'render') and not respuesta.is_rendered:
+                respuesta.render()
+        return respuesta
+
+    return envoltura
+
+
+class LecturaReplicaAdminMixin:
+    """
+    Los listados del admin (GET) leen de la réplica; las acciones escriben en 'default'. Un listado
+    con list_editable lee de 'default': sus valores iniciales vuelven en el POST y, si vinieran de
+    la réplica atrasada, se guardarían encima de los cambios recientes.
+    """
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'GET' or self.list_editable:
+            return super().changelist_view(request, extra_context)
+
+        with leyendo_de_replica():
+            respuesta = super().changelist_view(request, extra_context)
+            if hasattr(respuesta, 'render') and not respuesta.is_rendered:
+                respuesta.render()
+        return respuesta
+
+
+class ReplicaRouter:
+    """Envía a la réplica de solo lectura las lecturas marcadas como analíticas."""
+
+    def db_for_read(self, model, **hints):
+        if _leer_de_replica.get() and replica_disponible():
+            return ALIAS_REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # La réplica es una copia de 'default': los objetos de ambas se pueden relacionar.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != ALIAS_REPLICA
@@ -0,0 +1,138 @@
+from bisect import bisect_left
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from .models import Venta, ResumenArchivoCliente, SegmentoCliente
+
+
+QUINTILES = 5
+TAMANO_LOTE = 5000
+
+
+def _metricas(clientes_con_ventas=None):
+    """
+    {cliente_id: [ultima_compra, frecuencia, monto]} con una consulta agrupada sobre las ventas
+    vigentes y otra sobre el resumen del archivo, leídas por lotes. `clientes_con_ventas` es un
+    queryset de ventas que limita el cálculo a sus clientes (modo incremental).
+    """
+    ventas = Venta.objects.filter(cliente__isnull=False)
+    archivo = ResumenArchivoCliente.objects.all()
+    if clientes_con_ventas is not None:
+        ids = clientes_con_ventas.values('cliente_id')
+        ventas = ventas.filter(cliente_id__in=ids)
+        archivo = archivo.filter(cliente_id__in=ids)
+
+    metricas = {}
+    filas = (
+        ventas.values('cliente_id')
+        .annotate(ultima=Max('fecha_venta'), ordenes=Count('id'), total=Sum('total'))
+        .values_list('cliente_id', 'ultima', 'ordenes', 'total')
+        .order_by()
+    )
+    for cliente_id, ultima, ordenes, total in filas.iterator(chunk_size=TAMANO_LOTE):
+        metricas[cliente_id] = [ultima, ordenes, total or Decimal('0')]
+
+    for cliente_id, ultima, ordenes, total in archivo.values_list(
+        'cliente_id', 'ultima_compra', 'ordenes', 'monto'
+    ).iterator(chunk_size=TAMANO_LOTE):
+        actual = metricas.setdefault(cliente_id, [ultima, 0, Decimal('0')])
+        actual[0] = max(filter(None, [actual[0], ultima]))
+        actual[1] += ordenes
+        actual[2] += total
+
+    return metricas
+
+
+def _cortes(valores):
+    """Límites entre quintiles de una lista de valores (4 cortes para 5 grupos; ninguno si está vacía)."""
+    ordenados = sorted(valores)
+    if not ordenados:
+        return []
+    return [ordenados[len(ordenados) * k // QUINTILES] for k in range(1, QUINTILES)]
+
+
+def clasificar(r, f):
+    """Segmento a partir de los puntajes de recencia y frecuencia."""
+    if r >= 4 and f >= 4:
+        return 'CAMPEONES'
+    if r >= 3 and f >= 3:
+        return 'LEALES'
+    if r >= 4:
+        return 'NUEVOS'
+    if r == 3:
+        return 'POTENCIALES'
+    if f >= 3:
+        return 'EN_RIESGO'
+    if r == 2:
+        return 'HIBERNANDO'
+    return 'PERDIDOS'
+
+
+def calcular_rfm(incremental=False):
+    """
+    Calcula los puntajes RFM de los clientes con compras. Los cortes de quintiles siempre se
+    calculan sobre toda la población; en modo incremental solo se recalculan y guardan los
+    clientes con ventas posteriores al último cálculo (el resto toma sus métricas guardadas).
+    Sin clientes con compras, el cálculo completo deja la tabla de segmentos vacía. Devuelve la cantidad de clientes guardados.
+    """
+    ahora = timezone.now()
+    ultimo_calculo = SegmentoCliente.objects.aggregate(ultimo=Max('calculado_en'))['ultimo']
+    incremental = incremental and ultimo_calculo is not None
+
+    if incremental:
+        cambiados = _metricas(Venta.objects.filter(fecha_venta__gt=ultimo_calculo))
+        if not cambiados:
+            return 0
+        poblacion = {
+            cliente_id: [ultima, frecuencia, monto]
+            for cliente_id, ultima, frecuencia, monto in SegmentoCliente.objects.values_list(
+                'cliente_id', 'ultima_compra', 'frecuencia', 'monto'
+            ).iterator(chunk_size=TAMANO_LOTE)
+        }
+        poblacion.update(cambiados)
+    else:
+        cambiados = poblacion = _metricas()
+
+    recencias = {cliente_id: (ahora - m[0]).days for cliente_id, m in poblacion.items()}
+    cortes_r = _cortes(recencias.values())
+    cortes_f = _cortes(m[1] for m in poblacion.values())
+    cortes_m = _cortes(m[2] for m in poblacion.values())
+
+    segmentos = []
+    for cliente_id, (ultima, frecuencia, monto) in cambiados.items():
+        recencia = recencias[cliente_id]
+        # Menos días desde la última compra es mejor; en frecuencia y monto, más es mejor.
+        r = QUINTILES - bisect_left(cortes_r, recencia)
+        f = bisect_left(cortes_f, frecuencia) + 1
+        m = bisect_left(cortes_m, monto) + 1
+        segmentos.append(SegmentoCliente(
+            cliente_id=cliente_id,
+            ultima_compra=ultima,
+            recencia_dias=recencia,
+            frecuencia=frecuencia,
+            monto=monto,
+            puntaje_r=r,
+            puntaje_f=f,
+            puntaje_m=m,
+            rfm=f"{r}{f}{m}",
+            segmento=clasificar(r, f),
+            calculado_en=ahora,
+        ))
+
+    campos = [
+        'ultima_compra', 'recencia_dias', 'frecuencia', 'monto', 'puntaje_r', 'puntaje_f',
+        'puntaje_m', 'rfm', 'segmento', 'calculado_en',
+    ]
+    with transaction.atomic():
+        if incremental:
+            SegmentoCliente.objects.bulk_create(
+                segmentos, batch_size=1000, update_conflicts=True, unique_fields=['cliente'], update_fields=campos,
+            )
+        else:
+            SegmentoCliente.objects.all().delete()
+            SegmentoCliente.objects.bulk_create(segmentos, batch_size=1000)
+
+    return len(segmentos)
@@ -0,0 +1,74 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .eventos import publicar, publicar_stock, PROMOCION_CAMBIADA
+from .models import Categoria, Producto, Promocion, StockSucursal
+from .versiones import incrementar_version_catalogo, incrementar_version_promociones
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def invalidar_catalogo(sender, **kwargs):
+    """Cualquier cambio en el catálogo invalida los fragmentos en caché de la tienda."""
+    # Tras el commit, para que ningún proceso vuelva a cachear datos aún no confirmados.
+    transaction.on_commit(incrementar_version_catalogo)
+
+
+@receiver(post_save, sender=Promocion)
+@receiver(post_delete, sender=Promocion)
+def invalidar_promociones(sender, **kwargs):
+    """Un cambio en una promoción invalida el índice de vigencias y las tarjetas de la tienda."""
+    transaction.on_commit(incrementar_version_promociones)
+    transaction.on_commit(incrementar_version_catalogo)
+
+
+@receiver(m2m_changed, sender=Promocion.productos.through)
+def invalidar_catalogo_por_productos_en_promocion(sender, action, **kwargs):
+    """Asignar o quitar productos de una promoción cambia su alcance y las tarjetas de la tienda."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(incrementar_version_promociones)
+        transaction.on_commit(incrementar_version_catalogo)
+
+
+@receiver(post_save, sender=Producto)
+def registrar_stock_producto(sender, instance, **kwargs):
+    publicar_stock(instance.pk, stock=instance.stock)
+
+
+@receiver(post_save, sender=StockSucursal)
+def registrar_stock_sucursal(sender, instance, **kwargs):
+    publicar_stock(instance.producto_id, sucursal_id=instance.sucursal_id, stock=instance.cantidad)
+
+
+@receiver(post_save, sender=Promocion)
+def registrar_promocion_guardada(sender, instance, created, **kwargs):
+    publicar(PROMOCION_CAMBIADA, {
+        'promocion_id': instance.pk,
+        'accion': 'creada' if created else 'modificada',
+        'nombre': instance.nombre,
+        'tipo': instance.tipo,
+        'valor_descuento': instance.valor_descuento,
+        'fecha_inicio': instance.fecha_inicio,
+        'fecha_fin': instance.fecha_fin,
+    })
+
+
+@receiver(post_delete, sender=Promocion)
+def registrar_promocion_eliminada(sender, instance, **kwargs):
+    publicar(PROMOCION_CAMBIADA, {'promocion_id': instance.pk, 'accion': 'eliminada'})
+
+
+@receiver(m2m_changed, sender=Promocion.productos.through)
+def registrar_productos_de_promocion(sender, instance, action, pk_set, reverse, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    accion = action.replace('post_', 'productos_')
+    if not reverse:
+        publicar(PROMOCION_CAMBIADA, {'promocion_id': instance.pk, 'accion': accion, 'producto_ids': sorted(pk_set or [])})
+        return
+    # Cambio hecho desde el producto (producto.promociones.add(...)): un evento por promoción.
+    for promocion_id in sorted(pk_set or []):
+        publicar(PROMOCION_CAMBIADA, {'promocion_id': promocion_id, 'accion': accion, 'producto_ids': [instance.pk]})
@@ -1,3 +1,222 @@
-from django.test import TestCase
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .inventario import StockInsuficiente, descontar_stock, movimientos_en_bloque
+from .models import Categoria, Cliente, MovimientoStock, Producto, StockSucursal, Sucursal, Venta
+from .precios import aplicar_cambios, calcular_cambios
+from .reconciliacion import (
+    diferencias_stock_general, diferencias_stock_sucursal, registrar_saldos_iniciales, reparar,
+)
+
+
+def _inserciones_libro(consultas):
+    return [c for c in consultas if c['sql'].startswith('INSERT') and 'gestion_movimientostock' in c['sql']]
+
+
+# Sin registro de eventos en disco ni límite de tasa: las pruebas miden el stock, no esas capas.
+@override_settings(EVENTOS_HABILITADOS=False, LIMITES_TASA={})
+class InventarioTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Categoria.objects.create(nombre='Helados')
+        # Inactiva: el checkout descuenta del stock general salvo en las pruebas que pasan la sucursal.
+        cls.sucursal = Sucursal.objects.create(nombre='Centro', activa=False)
+
+    def crear_producto(self, nombre='Chocolate', stock=10):
+        producto = Producto.objects.create(nombre=nombre, precio=1000, stock=stock, categoria=self.categoria)
+        registrar_saldos_iniciales()
+        return producto
+
+
+class DescontarStockTests(InventarioTestCase):
+
+    def test_descuenta_y_deja_un_movimiento(self):
+        producto = self.crear_producto(stock=5)
+        descontar_stock(producto, 3)
+
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock, 2)
+        movimiento = MovimientoStock.objects.get(producto=producto, tipo='VENTA')
+        self.assertEqual((movimiento.cantidad, movimiento.sucursal_id), (-3, None))
+
+    def test_sin_stock_suficiente_no_descuenta_ni_registra(self):
+        producto = self.crear_producto(stock=2)
+        with self.assertRaises(StockInsuficiente):
+            descontar_stock(producto, 3)
+
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock, 2)
+        self.assertFalse(MovimientoStock.objects.filter(tipo='VENTA').exists())
+
+    def test_descuenta_de_la_sucursal(self):
+        producto = self.crear_producto(stock=0)
+        StockSucursal.objects.create(sucursal=self.sucursal, producto=producto, cantidad=4)
+        with self.assertRaises(StockInsuficiente):
+            descontar_stock(producto, 5, sucursal_id=self.sucursal.pk)
+
+        descontar_stock(producto, 4, sucursal_id=self.sucursal.pk)
+        self.assertEqual(StockSucursal.objects.get(producto=producto).cantidad, 0)
+        self.assertEqual(MovimientoStock.objects.get(tipo='VENTA').sucursal_id, self.sucursal.pk)
+
+    def test_movimientos_en_bloque_inserta_una_vez(self):
+        productos = [self.crear_producto(f"Sabor {i}") for i in range(3)]
+        with CaptureQueriesContext(connection) as consultas, movimientos_en_bloque():
+            for producto in productos:
+                descontar_stock(producto, 1)
+
+        self.assertEqual(len(_inserciones_libro(consultas.captured_queries)), 1)
+        self.assertEqual(MovimientoStock.objects.filter(tipo='VENTA').count(), 3)
+
+    def test_movimientos_en_bloque_no_registra_si_falla(self):
+        producto = self.crear_producto(stock=1)
+        with self.assertRaises(StockInsuficiente), movimientos_en_bloque():
+            descontar_stock(producto, 1)
+            descontar_stock(producto, 1)
+        self.assertFalse(MovimientoStock.objects.filter(tipo='VENTA').exists())
+
+
+class CheckoutTests(InventarioTestCase):
+
+    def setUp(self):
+        usuario = User.objects.create_user('cliente', password='clave')
+        self.cliente = Cliente.objects.create(user=usuario)
+        self.client.force_login(usuario)
+
+    def test_un_movimiento_por_linea_en_una_insercion(self):
+        productos = [self.crear_producto(f"Sabor {i}", stock=5) for i in range(3)]
+        for producto in productos:
+            self.client.post(reverse('agregar_a_carrito', args=[producto.pk]), {'cantidad': 2})
+
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('finalizar_orden'))
+
+        self.assertRedirects(respuesta, reverse('historial_pedidos'), fetch_redirect_response=False)
+        venta = Venta.objects.get(cliente=self.cliente)
+        self.assertEqual(
+            sorted(MovimientoStock.objects.filter(venta=venta).values_list('producto_id', 'cantidad')),
+            [(producto.pk, -2) for producto in productos],
+        )
+        self.assertEqual(len(_inserciones_libro(consultas.captured_queries)), 1)
+        call_command('reconciliar_inventario', stdout=StringIO())
+
+    def test_sin_stock_no_quedan_venta_ni_movimientos(self):
+        producto = self.crear_producto(stock=1)
+        self.client.post(reverse('agregar_a_carrito', args=[producto.pk]), {'cantidad': 2})
+
+        respuesta = self.client.get(reverse('finalizar_orden'))
+
+        self.assertRedirects(respuesta, reverse('ver_carrito'), fetch_redirect_response=False)
+        self.assertFalse(Venta.objects.exists())
+        self.assertFalse(MovimientoStock.objects.filter(tipo='VENTA').exists())
+
+
+class EdicionStockAdminTests(InventarioTestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@heladeria.cl', 'clave'))
+
+    def datos(self, producto, stock_mostrado, **cambios):
+        """POST del formulario de cambio tal como lo envía el navegador que mostró `stock_mostrado`."""
+        return {
+            'nombre': producto.nombre, 'precio': producto.precio, 'stock': stock_mostrado,
+            'initial-stock': stock_mostrado, 'categoria': self.categoria.pk,
+            'stocks_sucursal-TOTAL_FORMS': 0, 'stocks_sucursal-INITIAL_FORMS': 0,
+            **cambios,
+        }
+
+    def test_cambio_de_precio_conserva_la_venta_concurrente(self):
+        producto = self.crear_producto(stock=8)
+        descontar_stock(producto, 1)  # Se confirma mientras el formulario muestra 8.
+
+        url = reverse('admin:gestion_producto_change', args=[producto.pk])
+        respuesta = self.client.post(url, self.datos(producto, 8, precio=1200))
+
+        self.assertEqual(respuesta.status_code, 302)
+        producto.refresh_from_db()
+        self.assertEqual((producto.stock, producto.precio), (7, 1200))
+        self.assertFalse(MovimientoStock.objects.filter(tipo='AJUSTE').exists())
+
+    def test_cambio_de_stock_registra_la_diferencia_con_el_actual(self):
+        producto = self.crear_producto(stock=8)
+        descontar_stock(producto, 1)
+
+        url = reverse('admin:gestion_producto_change', args=[producto.pk])
+        self.client.post(url, self.datos(producto, 8, stock=15))
+
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock, 15)
+        self.assertEqual(MovimientoStock.objects.get(tipo='AJUSTE').cantidad, 8)
+        self.assertFalse(diferencias_stock_general().exists())
+
+    def test_carga_csv_con_venta_concurrente(self):
+        producto = self.crear_producto(stock=10)
+        cambios, _ = calcular_cambios([{'id': producto.pk, 'stock': 50}])
+        descontar_stock(producto, 1)  # Entre la vista previa y la confirmación.
+
+        aplicar_cambios(cambios)
+
+        self.assertEqual(MovimientoStock.objects.get(tipo='CARGA').cantidad, 41)
+        self.assertFalse(diferencias_stock_general().exists())
+
+
+class ReconciliacionTests(InventarioTestCase):
+
+    def test_repara_el_stock_con_saldo_inicial(self):
+        producto = self.crear_producto(stock=10)
+        descontar_stock(producto, 2)
+        Producto.objects.filter(pk=producto.pk).update(stock=99)
+
+        productos = list(diferencias_stock_general())
+        self.assertEqual([(p.pk, p.libro, p.con_saldo_inicial) for p in productos], [(producto.pk, 8, True)])
+        self.assertEqual(reparar(productos, [], []), (1, 0, 0))
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock, 8)
+
+    def test_sin_saldo_inicial_no_se_repara(self):
+        # Stock anterior al libro: 100, una venta y un ajuste dejan el libro en 10 con stock 110.
+        producto = Producto.objects.create(nombre='Antiguo', precio=1000, stock=100, categoria=self.categoria)
+        descontar_stock(producto, 1)
+        Producto.objects.filter(pk=producto.pk).update(stock=110)
+        MovimientoStock.objects.create(producto=producto, cantidad=11, tipo='AJUSTE')
+
+        productos = list(diferencias_stock_general())
+        self.assertEqual([(p.libro, p.con_saldo_inicial) for p in productos], [(10, False)])
+        self.assertEqual(reparar(productos, [], []), (0, 0, 0))
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock, 110)
+        with self.assertRaises(CommandError):
+            call_command('reconciliar_inventario', reparar=True, stdout=StringIO())
+
+        self.assertEqual(registrar_saldos_iniciales(), 1)
+        self.assertEqual(MovimientoStock.objects.get(producto=producto, tipo='INICIAL').cantidad, 100)
+        self.assertFalse(diferencias_stock_general().exists())
+        self.assertEqual(registrar_saldos_iniciales(), 0)
+
+    def test_libro_negativo_no_se_repara(self):
+        producto = self.crear_producto(stock=1)
+        MovimientoStock.objects.create(producto=producto, cantidad=-5, tipo='AJUSTE')
+
+        self.assertEqual(reparar(list(diferencias_stock_general()), [], []), (0, 0, 0))
+
+    def test_stock_por_sucursal(self):
+        producto = self.crear_producto(stock=0)
+        fila = StockSucursal.objects.create(sucursal=self.sucursal, producto=producto, cantidad=6)
+        self.assertEqual([s.con_saldo_inicial for s in diferencias_stock_sucursal()], [False])
+
+        registrar_saldos_iniciales()
+        descontar_stock(producto, 2, sucursal_id=self.sucursal.pk)
+        StockSucursal.objects.filter(pk=fila.pk).update(cantidad=1)
+
+        filas = list(diferencias_stock_sucursal())
+        self.assertEqual([(s.libro, s.con_saldo_inicial) for s in filas], [(4, True)])
+        self.assertEqual(reparar([], filas, []), (0, 1, 0))
+        fila.refresh_from_db()
+        self.assertEqual(fila.cantidad, 4)
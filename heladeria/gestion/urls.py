@@ -9,6 +9,9 @@ urlpatterns = [
 
     
     path('tienda/', views.producto_listado, name='producto_listado'),
+    path('tienda/sucursal/', views.seleccionar_sucursal, name='seleccionar_sucursal'),
+    path('tienda/categoria/<int:categoria_id>/', views.productos_categoria, name='productos_categoria'),
+    path('tienda/eventos/', views.eventos_tienda, name='eventos_tienda'),
     path('carrito/', views.ver_carrito, name='ver_carrito'),
     path('carrito/agregar/<int:producto_id>/', views.agregar_a_carrito, name='agregar_a_carrito'),
     path('carrito/quitar/<int:producto_id>/', views.quitar_de_carrito, name='quitar_de_carrito'),
@@ -17,11 +20,15 @@ urlpatterns = [
 
     
     path('reporte/clientes/', views.reporte_clientes, name='reporte_clientes'),
+    path('monitoreo/limites/', views.estado_limites, name='estado_limites'),
     
     
     path('marketing/', views.marketing_dashboard, name='marketing_dashboard'),
+    path('marketing/widgets/<str:nombre>/', views.dashboard_widget, name='dashboard_widget'),
     path('marketing/promocion/crear/', views.crear_promocion, name='crear_promocion'),
+    path('marketing/promocion/productos/', views.buscar_productos_promocion, name='buscar_productos_promocion'),
     
     
     path('marketing/promocion/<int:pk>/editar/', views.editar_promocion, name='editar_promocion'), 
+    path('marketing/promociones/efectividad/', views.efectividad_promociones, name='efectividad_promociones'),
 ]
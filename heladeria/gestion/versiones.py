@@ -0,0 +1,56 @@
+import time
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F
+
+from .models import VersionDatos
+
+
+CLAVE_VERSION_CATALOGO = 'gestion:version_catalogo'
+CLAVE_VERSION_PROMOCIONES = 'gestion:version_promociones'
+
+
+def _versiones():
+    # Siempre en la base principal: dentro de una vista de reportes la réplica puede estar atrasada.
+    return VersionDatos.objects.db_manager(DEFAULT_DB_ALIAS)
+
+
+def _version(clave):
+    version = _versiones().filter(clave=clave).values_list('valor', flat=True).first()
+    if version is None:
+        # Se parte de la hora actual para no reutilizar versiones anteriores si la fila se borró.
+        version = _versiones().get_or_create(clave=clave, defaults={'valor': int(time.time() * 1000)})[0].valor
+    return version
+
+
+def _incrementar(clave):
+    if not _versiones().filter(clave=clave).update(valor=F('valor') + 1):
+        _version(clave)
+        _versiones().filter(clave=clave).update(valor=F('valor') + 1)
+    return _version(clave)
+
+
+def version_catalogo():
+    """
+    Devuelve la versión actual del catálogo. Forma parte de la clave de los fragmentos
+    en caché, por lo que incrementarla invalida todas las tarjetas de producto a la vez.
+    """
+    return _version(CLAVE_VERSION_CATALOGO)
+
+
+def incrementar_version_catalogo():
+    """Invalida los fragmentos del catálogo (productos, categorías y promociones)."""
+    return _incrementar(CLAVE_VERSION_CATALOGO)
+
+
+def version_promociones():
+    """Devuelve la versión de las promociones; el índice de vigencias se reconstruye cuando cambia."""
+    return _version(CLAVE_VERSION_PROMOCIONES)
+
+
+def incrementar_version_promociones():
+    """
+    Marca el índice de promociones como desactualizado en todos los procesos: cada uno compara
+    la versión guardada en la base con la de su índice en la siguiente consulta.
+    """
+    return _incrementar(CLAVE_VERSION_PROMOCIONES)
@@ -2,17 +2,47 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
+from django.conf import settings
 from django.db import transaction
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 
-from django.db.models import Sum, F, Max, Count
-from datetime import date, timedelta 
+from django.db.models import Sum, F, Max, Count, Q, Value, Window
+from django.db.models.functions import Coalesce, RowNumber
+from datetime import date 
+from decimal import Decimal
+import asyncio
 
 
 
-from .models import Cliente, Producto, Promocion, Venta, DetalleVenta
+from .models import Cliente, Producto, Promocion, Venta, DetalleVenta, EfectividadPromocion, Sucursal, SegmentoCliente
 from .forms import ClienteUserCreationForm, PromocionForm 
+from .analitica import calcular_efectividad_promociones
+from .indice_promociones import obtener_indice
+from .routers import usar_replica
+from .eventos import publicar_venta
+from .difusion import difusor
+from .archivo import pedidos_de_cliente
+from .inventario import sucursales_activas, sucursal_de_sesion, disponibilidad_por_sucursal, movimientos_en_bloque
+from .widgets import WIDGETS, renderizar_widget
+from .alcance_promociones import filtrar_productos
+from .limites import cubetas
 
 
+PEDIDOS_POR_PAGINA = 10
+
+SSE_LATIDO_SEGUNDOS = 20
+
+PRODUCTOS_POR_SECCION = 12
+
+PRODUCTOS_POR_PAGINA_SELECTOR = 20
+
+ORDENES_REPORTE_CLIENTES = {
+    'monto': F('monto_total_gastado').desc(),
+    'rfm': F('segmento__rfm').desc(nulls_last=True),
+    'recencia': F('segmento__recencia_dias').asc(nulls_last=True),
+    'frecuencia': F('total_ordenes').desc(),
+}
 
 
 
@@ -50,68 +80,176 @@ def register(request):
 
 @login_required
 @user_passes_test(is_staff_user, login_url='/') 
+@usar_replica
 def reporte_clientes(request):
     """Vista de reporte de todos los clientes (acceso para administración o marketing)."""
     
+    # Las ventas archivadas se suman desde el resumen por cliente (una fila por cliente).
     datos_clientes = (
         Cliente.objects
-        .select_related('user')
+        .select_related('user', 'segmento')
         .annotate(
-            total_ordenes=Count('ventas__id', distinct=True),
-            monto_total_gastado=Sum('ventas__total'),
-            ultima_compra=Max('ventas__fecha_venta')
+            total_ordenes=Count('ventas__id', distinct=True) + Coalesce(F('resumen_archivo__ordenes'), 0),
+            monto_total_gastado=Coalesce(Sum('ventas__total'), Value(Decimal('0'))) + Coalesce(F('resumen_archivo__monto'), Value(Decimal('0'))),
+            ultima_compra=Coalesce(Max('ventas__fecha_venta'), F('resumen_archivo__ultima_compra'))
         )
-        .order_by('-monto_total_gastado')
     )
+
+    # Filtro y orden por el segmento RFM calculado con 'calcular_rfm'.
+    segmento = request.GET.get('segmento', '')
+    if segmento in dict(SegmentoCliente.SEGMENTO_CHOICES):
+        datos_clientes = datos_clientes.filter(segmento__segmento=segmento)
+
+    orden = request.GET.get('orden', '')
+    if orden not in ORDENES_REPORTE_CLIENTES:
+        orden = 'monto'
+    datos_clientes = datos_clientes.order_by(ORDENES_REPORTE_CLIENTES[orden])
     
-    context = {'datos_clientes': datos_clientes}
+    context = {
+        'datos_clientes': datos_clientes,
+        'segmentos': SegmentoCliente.SEGMENTO_CHOICES,
+        'segmento_actual': segmento,
+        'orden_actual': orden,
+    }
     return render(request, 'gestion/reporte_clientes.html', context)
 
 
 
+def _productos_en_stock(sucursal):
+    """Productos con stock en la sucursal de la sesión (o stock general si no hay sucursales)."""
+    if sucursal:
+        return Producto.objects.filter(stocks_sucursal__sucursal=sucursal, stocks_sucursal__cantidad__gt=0)
+    return Producto.objects.filter(stock__gt=0)
+
+
+def _preparar_tarjetas(productos, sucursales, sucursal, hoy):
+    """
+    Agrega a cada producto su disponibilidad (sucursal actual y todas) y devuelve sus promociones
+    vigentes {producto_id: [...]}, con una consulta agregada para el stock y el índice de promociones.
+    """
+    disponibilidad = disponibilidad_por_sucursal([p.id for p in productos]) if sucursales else {}
+    for producto in productos:
+        por_sucursal = disponibilidad.get(producto.id, {})
+        producto.disponible = por_sucursal.get(sucursal.id, 0) if sucursal else producto.stock
+        producto.disponibilidad = [(s, por_sucursal.get(s.id, 0)) for s in sucursales]
+
+    vigentes_por_producto = obtener_indice().vigentes_por_producto(hoy, [p.id for p in productos])
+    return {
+        producto_id: [
+            {'nombre': promo.nombre, 'descuento': promo.valor_descuento, 'tipo': promo.tipo}
+            for promo in promos
+        ]
+        for producto_id, promos in vigentes_por_producto.items()
+    }
+
+
 def producto_listado(request):
-    """Muestra todos los productos en stock, agrupados por categoría y con promociones activas."""
+    """
+    Muestra los productos en stock por categoría: los primeros PRODUCTOS_POR_SECCION de cada una
+    (una sola consulta con ROW_NUMBER por categoría); el resto se carga con productos_categoria.
+    """
     hoy = date.today()
-    productos_en_stock = Producto.objects.filter(stock__gt=0).select_related('categoria')
+    sucursales = sucursales_activas()
+    sucursal = sucursal_de_sesion(request, sucursales)
+
+    # Se pide uno más por categoría para saber si la sección tiene otra página.
+    productos = list(
+        _productos_en_stock(sucursal)
+        .annotate(posicion=Window(
+            RowNumber(), partition_by=F('categoria_id'), order_by=[F('nombre').asc(), F('id').asc()],
+        ))
+        .filter(posicion__lte=PRODUCTOS_POR_SECCION + 1)
+        .select_related('categoria')
+        .order_by('categoria__nombre', 'categoria_id', 'posicion')
+    )
 
-    promociones_activas = Promocion.objects.filter(
-        fecha_inicio__lte=hoy,
-        fecha_fin__gte=hoy
-    ).prefetch_related('productos')
-    
-    promociones_por_producto = {}
-    for promo in promociones_activas:
-        productos_aplicables = promo.productos.all()
-        
-        if not productos_aplicables:
-            productos_a_iterar = productos_en_stock
+    secciones = []
+    for producto in productos:
+        if not secciones or secciones[-1]['categoria'].id != producto.categoria_id:
+            secciones.append({'categoria': producto.categoria, 'productos': [], 'hay_mas': False})
+        if producto.posicion > PRODUCTOS_POR_SECCION:
+            secciones[-1]['hay_mas'] = True
         else:
-            
-            productos_a_iterar = productos_en_stock.filter(id__in=[p.id for p in productos_aplicables])
+            secciones[-1]['productos'].append(producto)
 
-        for producto in productos_a_iterar:
-            if producto.id not in promociones_por_producto:
-                promociones_por_producto[producto.id] = []
-            
-            promociones_por_producto[producto.id].append({
-                'nombre': promo.nombre,
-                'descuento': promo.valor_descuento, 
-                'tipo': promo.tipo
-            })
+    visibles = [producto for seccion in secciones for producto in seccion['productos']]
+    context = {
+        'secciones': secciones,
+        'promociones_por_producto': _preparar_tarjetas(visibles, sucursales, sucursal, hoy),
+        'hoy': hoy,
+        'sucursales': sucursales,
+        'sucursal': sucursal,
+    }
+
+    return render(request, 'productos/listado.html', context)
 
-    categorias = {}
-    for producto in productos_en_stock:
-        cat_nombre = producto.categoria.nombre
-        if cat_nombre not in categorias:
-            categorias[cat_nombre] = []
-        categorias[cat_nombre].append(producto)
+
+def productos_categoria(request, categoria_id):
+    """
+    Siguiente página de una sección de la tienda (fragmento HTML para el scroll infinito).
+    Pagina por cursor: ?despues=<id del último producto mostrado>, en el orden (nombre, id).
+    """
+    hoy = date.today()
+    sucursales = sucursales_activas()
+    sucursal = sucursal_de_sesion(request, sucursales)
+
+    productos = _productos_en_stock(sucursal).filter(categoria_id=categoria_id)
+    despues = request.GET.get('despues', '')
+    if despues.isdigit():
+        ultimo = Producto.objects.filter(pk=despues, categoria_id=categoria_id).values_list('nombre', 'id').first()
+        if ultimo:
+            productos = productos.filter(Q(nombre__gt=ultimo[0]) | Q(nombre=ultimo[0], id__gt=ultimo[1]))
+
+    productos = list(productos.order_by('nombre', 'id')[:PRODUCTOS_POR_SECCION + 1])
+    hay_mas = len(productos) > PRODUCTOS_POR_SECCION
+    productos = productos[:PRODUCTOS_POR_SECCION]
 
     context = {
-        'categorias': categorias.items(),
-        'promociones_por_producto': promociones_por_producto,
+        'categoria_id': categoria_id,
+        'productos': productos,
+        'hay_mas': hay_mas,
+        'promociones_por_producto': _preparar_tarjetas(productos, sucursales, sucursal, hoy),
+        'hoy': hoy,
     }
+    return render(request, 'productos/_pagina_categoria.html', context)
 
-    return render(request, 'productos/listado.html', context)
+
+def seleccionar_sucursal(request):
+    """Guarda en sesión la sucursal desde la que el cliente quiere comprar."""
+    if request.method == 'POST':
+        sucursal = get_object_or_404(Sucursal, id=request.POST.get('sucursal_id'), activa=True)
+        request.session['sucursal_id'] = sucursal.id
+        messages.info(request, f"Comprando en la sucursal {sucursal.nombre}.")
+
+    return redirect('producto_listado')
+
+
+async def eventos_tienda(request):
+    """
+    Flujo Server-Sent Events con los cambios de stock y promociones para la tienda.
+    Necesita un servidor ASGI (ver heladeria/asgi.py); bajo WSGI responde 204 y el navegador no reintenta.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    async def flujo():
+        suscriptor = difusor.suscribir()
+        _, cola = suscriptor
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    yield await asyncio.wait_for(cola.get(), timeout=SSE_LATIDO_SEGUNDOS)
+                except asyncio.TimeoutError:
+                    # Comentario SSE para que proxies y navegador no cierren la conexión inactiva.
+                    yield ': latido\n\n'
+        finally:
+            difusor.desuscribir(suscriptor)
+
+    response = StreamingHttpResponse(flujo(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 @login_required
@@ -215,13 +353,16 @@ def finalizar_orden(request):
         return redirect('producto_listado')
 
     try:
-        with transaction.atomic():
+        # Los movimientos del libro de stock de todas las líneas se insertan juntos, antes del commit.
+        with transaction.atomic(), movimientos_en_bloque():
             
             cliente = get_object_or_404(Cliente, user=request.user) 
 
-            venta = Venta.objects.create(cliente=cliente)
+            venta = Venta.objects.create(cliente=cliente, sucursal=sucursal_de_sesion(request))
+            detalles = []
             total_venta = 0
             hoy = date.today()
+            indice = obtener_indice()
 
             for id_str, item in carrito.items():
                 producto = get_object_or_404(Producto, id=int(id_str))
@@ -229,20 +370,14 @@ def finalizar_orden(request):
                 precio_unitario_base = producto.precio
 
                 
-                if producto.stock < cantidad:
-                    raise Exception(f"Stock insuficiente para {producto.nombre}. Disponible: {producto.stock}")
-
-                
-                promociones = Promocion.objects.filter(
-                    productos=producto,
-                    fecha_inicio__lte=hoy,
-                    fecha_fin__gte=hoy,
-                    tipo='PORCENTAJE' 
-                )
+                promociones = [
+                    p for p in indice.vigentes(hoy, producto_id=producto.id, incluir_globales=False)
+                    if p.tipo == 'PORCENTAJE'
+                ]
 
                 precio_a_usar = precio_unitario_base
                 
-                if promociones.exists():
+                if promociones:
                     
                     max_descuento_porcentaje = max(p.valor_descuento for p in promociones) 
                     precio_a_usar = precio_unitario_base * (1 - (max_descuento_porcentaje / 100))
@@ -250,22 +385,21 @@ def finalizar_orden(request):
                 subtotal = precio_a_usar * cantidad
                 total_venta += subtotal
 
-                DetalleVenta.objects.create(
+                # DetalleVenta.save descuenta el stock de la sucursal de la venta con un UPDATE
+                # condicional y lanza StockInsuficiente si no alcanza.
+                detalles.append(DetalleVenta.objects.create(
                     venta=venta,
                     producto=producto,
                     cantidad=cantidad,
                     precio_unitario=precio_a_usar,
                     subtotal=subtotal
-                )
-                
-                
-                producto.stock -= cantidad
-                producto.save()
+                ))
 
 
             
             venta.total = total_venta
             venta.save()
+            publicar_venta(venta, detalles)
 
             del request.session['carrito']
             request.session.modified = True
@@ -287,10 +421,23 @@ def historial_pedidos(request):
     """Muestra el historial de compras del cliente."""
     try:
         cliente = get_object_or_404(Cliente, user=request.user)
-        
-        pedidos = Venta.objects.filter(cliente=cliente).prefetch_related('detalles__producto').order_by('-fecha_venta')
 
-        context = {'pedidos': pedidos}
+        try:
+            pagina = max(int(request.GET.get('pagina', 1)), 1)
+        except ValueError:
+            pagina = 1
+
+        # Al pasar el final de las ventas vigentes, el historial sigue en las archivadas.
+        pedidos, total = pedidos_de_cliente(cliente, pagina, PEDIDOS_POR_PAGINA)
+        total_paginas = max((total + PEDIDOS_POR_PAGINA - 1) // PEDIDOS_POR_PAGINA, 1)
+
+        context = {
+            'pedidos': pedidos,
+            'pagina': pagina,
+            'total_paginas': total_paginas,
+            'pagina_anterior': pagina - 1 if pagina > 1 else None,
+            'pagina_siguiente': pagina + 1 if pagina < total_paginas else None,
+        }
         return render(request, 'productos/historial_pedidos.html', context)
 
     except Cliente.DoesNotExist:
@@ -303,55 +450,94 @@ def historial_pedidos(request):
 @login_required
 @user_passes_test(is_staff_user, login_url='/') 
 def marketing_dashboard(request):
-    """Vista para el administrador de marketing, ahora incluye analíticas y todas las promociones."""
-    hoy = date.today()
-    fecha_limite_vencimiento = hoy + timedelta(days=30)
-    
-    
-    resumen = {
-        'total_clientes': Cliente.objects.count(),
-        
-        'total_ventas': Venta.objects.count(), 
-        'total_productos': Producto.objects.count(),
-        'promociones_activas': Promocion.objects.filter(fecha_fin__gte=hoy).count(),
-        'ventas_total_monto': Venta.objects.aggregate(total=Sum('total'))['total'] or 0,
-    }
+    """Vista para el administrador de marketing: la página carga cada widget por separado (ver dashboard_widget)."""
+    return render(request, 'gestion/marketing_dashboard.html')
 
-    
-    ultimas_ventas = (
-        Venta.objects
-        .select_related('cliente__user')
-        .prefetch_related('detalles__producto')
-        .order_by('-fecha_venta')[:5]
-    )
-    
-    
-    productos_mas_vendidos = (
-        DetalleVenta.objects
-        .values('producto__nombre')
-        .annotate(total_vendido=Sum('cantidad'))
-        .order_by('-total_vendido')[:5]
-    )
 
-    
-    productos_por_vencer = Producto.objects.filter(
-        fecha_vencimiento__lte=fecha_limite_vencimiento,
-        fecha_vencimiento__gte=hoy,
-        stock__gt=0
-    ).order_by('fecha_vencimiento')
+@login_required
+@user_passes_test(is_staff_user, login_url='/') 
+def dashboard_widget(request, nombre):
+    """
+    Fragmento HTML de un widget del dashboard, desde la caché; con POST se recalcula. Cada widget
+    decide si se calcula desde la réplica (ver gestion/widgets.py).
+    """
+    if nombre not in WIDGETS:
+        raise Http404("Widget desconocido.")
 
-    
-    todas_promociones = Promocion.objects.all().order_by('-fecha_inicio')
+    html, desde_cache = renderizar_widget(nombre, refrescar=request.method == 'POST')
+    response = HttpResponse(html)
+    response['X-Widget-Cache'] = 'HIT' if desde_cache else 'MISS'
+    return response
 
-    context = {
-        'resumen': resumen,
-        'ultimas_ventas': ultimas_ventas,
-        'productos_mas_vendidos': productos_mas_vendidos,
-        'productos_por_vencer': productos_por_vencer,
-        'todas_promociones': todas_promociones,
+
+@login_required
+@user_passes_test(is_staff_user, login_url='/') 
+def estado_limites(request):
+    """Contadores del límite de tasa de este proceso (permitidas y rechazadas por URL), en JSON."""
+    return JsonResponse(dict(cubetas.estado(), limites=getattr(settings, 'LIMITES_TASA', {})))
+
+
+def _productos_enviados(form, campo):
+    """Productos enviados en un campo de ids del formulario (agregar o quitar), para volver a mostrarlos si hay errores."""
+    if not form.is_bound:
+        return Producto.objects.none()
+    ids = [valor for valor in form[campo].value() or [] if str(valor).isdigit()]
+    return Producto.objects.filter(id__in=ids).only('id', 'nombre').order_by('nombre')
+
+
+def _contexto_promocion(form, modo, promocion=None):
+    """
+    Contexto del formulario de promociones. Del alcance actual solo se envía el total: la plantilla
+    lista los productos asignados por páginas con buscar_productos_promocion.
+    """
+    return {
+        'form': form,
+        'modo': modo,
+        'promocion': promocion,
+        'total_asignados': promocion.productos.count() if promocion else 0,
+        'productos_agregados': _productos_enviados(form, 'agregar_productos'),
+        'productos_quitados': _productos_enviados(form, 'quitar_productos'),
     }
 
-    return render(request, 'gestion/marketing_dashboard.html', context)
+
+@login_required
+@user_passes_test(is_staff_user, login_url='/') 
+def buscar_productos_promocion(request):
+    """
+    Selector de productos de las promociones: búsqueda paginada por nombre y categoría, en JSON.
+    Con `promocion` busca solo entre los productos ya asignados a esa promoción. Lee de la base
+    principal: recién guardado un alcance, la réplica todavía no lo tendría.
+    """
+    q = request.GET.get('q', '').strip()
+    categoria_id = request.GET.get('categoria') or None
+    if categoria_id and not categoria_id.isdigit():
+        categoria_id = None
+    promocion_id = request.GET.get('promocion', '')
+    try:
+        pagina = max(int(request.GET.get('pagina', 1)), 1)
+    except ValueError:
+        pagina = 1
+
+    productos = filtrar_productos(q, categoria_id)
+    if promocion_id.isdigit():
+        productos = productos.filter(promociones=promocion_id)
+    inicio = (pagina - 1) * PRODUCTOS_POR_PAGINA_SELECTOR
+    # Se pide uno de más para saber si hay otra página sin contar todo en cada página.
+    filas = list(
+        productos.order_by('nombre', 'id')
+        .values('id', 'nombre', 'categoria__nombre')[inicio:inicio + PRODUCTOS_POR_PAGINA_SELECTOR + 1]
+    )
+    datos = {
+        'resultados': [
+            {'id': fila['id'], 'nombre': fila['nombre'], 'categoria': fila['categoria__nombre']}
+            for fila in filas[:PRODUCTOS_POR_PAGINA_SELECTOR]
+        ],
+        'pagina': pagina,
+        'hay_mas': len(filas) > PRODUCTOS_POR_PAGINA_SELECTOR,
+    }
+    if pagina == 1:
+        datos['total'] = productos.count()
+    return JsonResponse(datos)
 
 
 @login_required
@@ -363,7 +549,9 @@ def crear_promocion(request):
         form = PromocionForm(request.POST) 
         
         if form.is_valid():
-            promocion = form.save() 
+            # Datos y alcance se guardan juntos: un fallo a mitad no deja un alcance a medias.
+            with transaction.atomic():
+                promocion = form.save()
             messages.success(request, f"Promoción '{promocion.nombre}' creada exitosamente.")
             return redirect('marketing_dashboard')
         else:
@@ -372,9 +560,7 @@ def crear_promocion(request):
         form = PromocionForm() 
 
     
-    productos = Producto.objects.all() 
-    context = {'form': form, 'productos': productos, 'modo': 'Crear'}
-    return render(request, 'gestion/crear_promocion.html', context)
+    return render(request, 'gestion/crear_promocion.html', _contexto_promocion(form, 'Crear'))
 
 
 @login_required
@@ -387,7 +573,8 @@ def editar_promocion(request, pk):
         form = PromocionForm(request.POST, instance=promocion)
         
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                form.save()
             messages.success(request, f"Promoción '{promocion.nombre}' actualizada exitosamente.")
             return redirect('marketing_dashboard')
         else:
@@ -395,10 +582,29 @@ def editar_promocion(request, pk):
     else:
         form = PromocionForm(instance=promocion)
 
-    productos = Producto.objects.all()
-    context = {'form': form, 'productos': productos, 'promocion': promocion, 'modo': 'Editar'}
+    return render(request, 'gestion/crear_promocion.html', _contexto_promocion(form, 'Editar', promocion))
+
+
+@login_required
+@user_passes_test(is_staff_user, login_url='/') 
+def efectividad_promociones(request):
+    """
+    Lista las promociones ordenadas por uplift; un POST recalcula el análisis completo. Lee de la
+    base principal: tras recalcular se redirige aquí y la réplica todavía no tendría los resultados.
+    """
+    if request.method == 'POST':
+        resultados = calcular_efectividad_promociones()
+        messages.success(request, f"Efectividad recalculada para {len(resultados)} promoción(es).")
+        return redirect('efectividad_promociones')
+
+    efectividades = (
+        EfectividadPromocion.objects
+        .select_related('promocion')
+        .order_by(F('uplift').desc(nulls_last=True))
+    )
 
-    return render(request, 'gestion/crear_promocion.html', context)
+    context = {'efectividades': efectividades}
+    return render(request, 'gestion/efectividad_promociones.html', context)
 
 
 @login_required
@@ -0,0 +1,108 @@
+from collections import namedtuple
+from contextlib import nullcontext
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.db.models import Max, Sum
+from django.template.loader import render_to_string
+
+from .archivo import totales_archivados, ranking_productos_vendidos
+from .indice_promociones import obtener_indice
+from .inventario import con_stock_total
+from .models import Cliente, Producto, Promocion, PronosticoProducto, Venta
+from .routers import leyendo_de_replica
+from .versiones import version_promociones
+
+
+# plantilla: fragmento HTML; calcular: devuelve su contexto; ttl: segundos en caché;
+# clave: parte variable de la clave de caché (además del nombre); replica: si se calcula leyendo
+# de la réplica. Los widgets cuya clave sale de datos de 'default' (una versión, el último cálculo)
+# no usan la réplica: guardarían bajo la clave nueva los datos atrasados hasta que venza el TTL.
+Widget = namedtuple('Widget', 'plantilla calcular ttl clave replica')
+
+
+def _resumen():
+    hoy = date.today()
+    ventas_archivadas, monto_archivado = totales_archivados()
+    return {'resumen': {
+        'total_clientes': Cliente.objects.count(),
+        'total_ventas': Venta.objects.count() + ventas_archivadas,
+        'total_productos': Producto.objects.count(),
+        'promociones_activas': len(obtener_indice().en_rango(hoy, date.max)),
+        'ventas_total_monto': (Venta.objects.aggregate(total=Sum('total'))['total'] or 0) + monto_archivado,
+    }}
+
+
+def _ultimas_ventas():
+    return {'ultimas_ventas': list(
+        Venta.objects
+        .select_related('cliente__user')
+        .prefetch_related('detalles__producto')
+        .order_by('-fecha_venta')[:5]
+    )}
+
+
+def _mas_vendidos():
+    return {'productos_mas_vendidos': ranking_productos_vendidos(5)}
+
+
+def _por_vencer():
+    hoy = date.today()
+    return {'productos_por_vencer': list(
+        con_stock_total(Producto.objects.filter(
+            fecha_vencimiento__lte=hoy + timedelta(days=30),
+            fecha_vencimiento__gte=hoy,
+        )).filter(stock_total__gt=0).order_by('fecha_vencimiento')
+    )}
+
+
+def _promociones():
+    return {'todas_promociones': list(Promocion.objects.all().order_by('-fecha_inicio'))}
+
+
+def _reposicion():
+    pronosticos = PronosticoProducto.objects.select_related('producto')
+    return {
+        'por_reponer': list(pronosticos.filter(cantidad_reponer__gt=0).order_by('dias_cobertura', '-cantidad_reponer')[:5]),
+        'en_riesgo': list(pronosticos.filter(riesgo_merma=True).order_by('-unidades_en_riesgo')[:5]),
+        'calculado_en': pronosticos.aggregate(ultimo=Max('calculado_en'))['ultimo'],
+    }
+
+
+def _ultimo_pronostico():
+    ultimo = PronosticoProducto.objects.aggregate(ultimo=Max('calculado_en'))['ultimo']
+    return ultimo.isoformat() if ultimo else ''
+
+
+WIDGETS = {
+    'resumen': Widget('gestion/widgets/resumen.html', _resumen, 300, lambda: '', True),
+    'ultimas_ventas': Widget('gestion/widgets/ultimas_ventas.html', _ultimas_ventas, 60, lambda: '', True),
+    'mas_vendidos': Widget('gestion/widgets/mas_vendidos.html', _mas_vendidos, 900, lambda: '', True),
+    'por_vencer': Widget('gestion/widgets/por_vencer.html', _por_vencer, 3600, lambda: date.today().isoformat(), True),
+    # El estado (activa/pendiente/vencida) depende del día, y la lista de las promociones guardadas.
+    'promociones': Widget(
+        'gestion/widgets/promociones.html', _promociones, 3600,
+        lambda: f"{version_promociones()}:{date.today().isoformat()}", False,
+    ),
+    # Cambia solo al correr calcular_pronosticos.
+    'reposicion': Widget('gestion/widgets/reposicion.html', _reposicion, 3600, _ultimo_pronostico, False),
+}
+
+
+def renderizar_widget(nombre, refrescar=False):
+    """
+    HTML del widget desde la caché, o calculado y guardado por su TTL. Con `refrescar`
+    se recalcula aunque haya una copia vigente. Devuelve (html, desde_cache).
+    """
+    widget = WIDGETS[nombre]
+    clave = f"dashboard:{nombre}:{widget.clave()}"
+
+    if not refrescar:
+        html = cache.get(clave)
+        if html is not None:
+            return html, True
+
+    with leyendo_de_replica() if widget.replica else nullcontext():
+        html = render_to_string(widget.plantilla, widget.calcular())
+    cache.set(clave, html, widget.ttl)
+    return html, False
@@ -5,6 +5,14 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+La tienda recibe los cambios de stock y promociones por Server-Sent Events
+(/tienda/eventos/), que solo funcionan servidos por ASGI, p. ej.:
+
+    uvicorn heladeria.asgi:application
+
+El difusor es del proceso: las conexiones SSE reciben los cambios confirmados en
+ese mismo proceso. Con varios workers, cada uno solo ve sus propias escrituras.
 """
 
 import os
@@ -43,6 +43,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'gestion.perfilado.PerfiladoMiddleware',
+    'gestion.limites.LimiteTasaMiddleware',
 ]
 
 ROOT_URLCONF = 'heladeria.urls'
@@ -61,24 +63,99 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'gestion.context_processors.roles', 
+                'gestion.context_processors.catalogo',
+                'gestion.context_processors.replica',
             ],
         },
     },
 ]
 
+# En producción las plantillas se compilan una sola vez por proceso (cargador en caché).
+if not DEBUG:
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
 WSGI_APPLICATION = 'heladeria.wsgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Copia de solo lectura para reportes y analíticas; se actualiza con `manage.py refrescar_replica`.
+REPLICA_SQLITE = BASE_DIR / 'db_replica.sqlite3'
+
+# Antigüedad (en segundos) a partir de la cual las páginas de staff avisan que la réplica está desactualizada.
+REPLICA_MAX_ANTIGUEDAD_SEGUNDOS = 15 * 60
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f'file:{REPLICA_SQLITE}?mode=ro',
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_ROUTERS = ['gestion.routers.ReplicaRouter']
+
+
+# Caché
+# 'template_fragments' guarda los fragmentos {% cache %} (navegación y tarjetas de producto).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'heladeria-default',
+    },
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'heladeria-fragmentos',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
 }
 
+# Segundos que vive un fragmento de plantilla en caché.
+CACHE_FRAGMENTOS_SEGUNDOS = 600
+
+
+# Perfilado bajo demanda
+# Staff: agregar ?perfilar=1 (o la cabecera X-Perfilar: 1). Los perfiles se ven en el admin.
+
+PERFILES_DIR = BASE_DIR / 'perfiles'
+
+# Fracción de peticiones anónimas que se perfilan (0 = desactivado, 0.01 = 1%).
+PERFILADO_TASA_ANONIMOS = 0
+
+
+# Registro de eventos (ventas, stock y promociones) para consumidores externos.
+# JSON por línea en EVENTOS_DIR; se rota y comprime al superar EVENTOS_TAMANO_MAX bytes.
+
+EVENTOS_HABILITADOS = True
+EVENTOS_DIR = BASE_DIR / 'eventos'
+EVENTOS_TAMANO_MAX = 10 * 1024 * 1024
+EVENTOS_COLA_MAX = 10000
+
+
+# Límite de tasa por cubetas de tokens (en memoria de cada proceso), por nombre de URL de gestion.urls.
+# (ráfaga, peticiones por minuto) por IP y por usuario; al superarlo se responde 429 con Retry-After.
+# Contadores en /monitoreo/limites/ (staff).
+
+LIMITES_TASA = {
+    'agregar_a_carrito': {'ip': (60, 120), 'usuario': (20, 60)},
+    'finalizar_orden': {'ip': (20, 30), 'usuario': (3, 6)},
+}
+
+# Solo si hay un proxy inverso de confianza delante: usar X-Forwarded-For como IP del cliente.
+LIMITES_TASA_CONFIAR_PROXY = False
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators